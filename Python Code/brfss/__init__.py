@@ -0,0 +1,77 @@
+"""Helpers for the Mental Health & Age analysis of the 2018 BRFSS survey.
+
+Modules that only need numpy and pandas are imported eagerly; names from the
+modules that pull in scipy are resolved on first access, so ``import brfss``
+(and the ``load``/``clean`` stages of ``python -m brfss``) stays cheap.
+"""
+
+import importlib
+
+from brfss.contingency import CountCube, chi2_tests
+from brfss.dedup import RowDeduplicator
+from brfss.figures import render_figures
+from brfss.filters import VALIDITY_RULES, apply_validity_rules
+from brfss.loader import DESIGN_VARIABLES, VARIABLES_TO_KEEP, iter_brfss_chunks, load_brfss
+from brfss.recode import RECODE_SPEC, recode
+from brfss.resample import resample, resample_indices
+from brfss.stats import StreamingStats, zscore_outliers
+from brfss.trend import age_trend
+from brfss.xport import XportFile
+
+_LAZY = {
+    "Correlation": "brfss.correlation",
+    "OneHotMatrix": "brfss.encoding",
+    "anova_type2": "brfss.anova",
+    "bootstrap_replicates": "brfss.bootstrap",
+    "confidence_intervals": "brfss.bootstrap",
+    "logistic_regression": "brfss.logistic",
+    "one_hot_encode": "brfss.encoding",
+    "permutation_tests": "brfss.permutation",
+    "rao_scott_chi2": "brfss.weighted",
+    "weighted_group_means": "brfss.weighted",
+    "weighted_table": "brfss.weighted",
+}
+
+__all__ = [
+    "Correlation",
+    "CountCube",
+    "DESIGN_VARIABLES",
+    "OneHotMatrix",
+    "RECODE_SPEC",
+    "RowDeduplicator",
+    "StreamingStats",
+    "VALIDITY_RULES",
+    "VARIABLES_TO_KEEP",
+    "XportFile",
+    "anova_type2",
+    "age_trend",
+    "apply_validity_rules",
+    "bootstrap_replicates",
+    "chi2_tests",
+    "confidence_intervals",
+    "iter_brfss_chunks",
+    "load_brfss",
+    "logistic_regression",
+    "one_hot_encode",
+    "permutation_tests",
+    "rao_scott_chi2",
+    "recode",
+    "render_figures",
+    "resample",
+    "resample_indices",
+    "weighted_group_means",
+    "weighted_table",
+    "zscore_outliers",
+]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,5 @@
+import sys
+
+from brfss.cli import main
+
+sys.exit(main())
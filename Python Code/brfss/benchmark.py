@@ -0,0 +1,182 @@
+"""Scaling benchmark of the pipeline stages on synthetic data.
+
+For every size the benchmark generates synthetic records
+(:mod:`brfss.synthetic`), optionally writes them to an XPT file so that the
+``load`` stage is timed too, and runs the stages of :mod:`brfss.pipeline`
+under a :class:`Profiler`.  The ``dedup`` stage streams the records through
+a :class:`RowDeduplicator` in loader-sized chunks, so its time per row
+shows whether duplicate removal stays linear as the file grows.  With
+``verify`` the statistics of each size are recomputed the way the original
+notebook did (``pd.crosstab`` + ``chi2_contingency``,
+``get_dummies(...).corr()`` and, when statsmodels is installed,
+``anova_lm(ols(...), typ=2)``) and the largest absolute differences are
+reported, so a faster stage can be checked against the reference at every
+scale.
+
+Run as ``python -m brfss.benchmark --sizes 100000 1000000 10000000``; the
+timings and checks are written as ``Benchmark Report.md``/``.json``.  At
+10^8 rows the raw frame alone takes about 4.4 GB.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from brfss import pipeline
+from brfss.dedup import RowDeduplicator
+from brfss.loader import DEFAULT_CHUNK_SIZE
+from brfss.paths import RESULTS_DIR
+from brfss.profiling import Profiler
+from brfss.synthetic import SyntheticBRFSS, write_xport
+
+DEFAULT_SIZES = [10 ** 5, 10 ** 6, 10 ** 7]
+REPORT_NAME = 'Benchmark Report'
+
+
+def reference_differences(resampled: pd.DataFrame, chi2: pd.DataFrame, anova: pd.DataFrame,
+                          correlation: pd.DataFrame) -> Dict[str, float]:
+    """Largest absolute differences to the notebook's original computations."""
+    from scipy.stats import chi2_contingency
+
+    differences = {}
+    reference = [chi2_contingency(pd.crosstab(resampled[row], resampled[column]))
+                 for row, column in zip(chi2['row'], chi2['column'])]
+    differences['chi2'] = float(np.max(np.abs(chi2['chi2'].to_numpy() - [r[0] for r in reference])))
+    differences['chi2_p'] = float(np.max(np.abs(chi2['p'].to_numpy() - [r[1] for r in reference])))
+
+    dummies = pd.get_dummies(resampled, columns=pipeline.FACTORS, dtype=float)
+    differences['corr'] = float(np.nanmax(np.abs(correlation.to_numpy() - dummies.corr().to_numpy())))
+
+    try:
+        from statsmodels.formula.api import ols
+        from statsmodels.stats.anova import anova_lm
+    except ImportError:
+        return differences
+    formula = f"{pipeline.RESPONSE} ~ " + ' + '.join(f"C({factor})" for factor in pipeline.FACTORS)
+    table = anova_lm(ols(formula, data=resampled).fit(), typ=2)
+    effects = anova.index.drop('Residual')
+    differences['anova_F'] = float(np.max(np.abs(anova.loc[effects, 'F'] - table.loc[effects, 'F'])))
+    differences['anova_p'] = float(np.max(np.abs(anova.loc[effects, 'PR(>F)'] - table.loc[effects, 'PR(>F)'])))
+    return differences
+
+
+def deduplicate(frame: pd.DataFrame, chunksize: int = DEFAULT_CHUNK_SIZE) -> pd.DataFrame:
+    """Rows of ``frame`` seen for the first time, deduplicated chunk by chunk as the loader does."""
+    dedup = RowDeduplicator()
+    return pd.concat([dedup.filter(frame.iloc[start:start + chunksize])
+                      for start in range(0, len(frame), chunksize)])
+
+
+def run_size(n_rows: int, generator: SyntheticBRFSS, seed: int = 1234,
+             xport_dir: Optional[str] = None, verify: bool = True,
+             trace_memory: bool = False) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Stage timings (one row per stage) and reference differences for one size."""
+    profiler = Profiler(trace_memory)
+    raw = profiler.measure('synthesize', generator.generate, n_rows, seed)
+    profiler.measure('dedup', deduplicate, raw)
+    if xport_dir is not None:
+        path = write_xport(raw, os.path.join(xport_dir, f"synthetic-{n_rows}.xpt"))
+        del raw
+        raw = profiler.measure('load', pipeline.load, path)
+        os.remove(path)
+
+    cleaned = profiler.measure('clean', pipeline.clean, raw)
+    del raw
+    resampled = profiler.measure('resample', pipeline.balance, cleaned, seed=seed)
+    chi2 = profiler.measure('chi2', pipeline.chi_square, resampled)
+    anova = profiler.measure('anova', pipeline.anova, resampled)
+    correlation = profiler.measure('correlate', pipeline.correlate, resampled)
+
+    timings = profiler.table()
+    timings.insert(0, 'size', n_rows)
+    differences = reference_differences(resampled, chi2, anova, correlation) if verify else {}
+    return timings, differences
+
+
+def run_benchmark(sizes: Sequence[int] = DEFAULT_SIZES, seed: int = 1234, xport: bool = False,
+                  verify: bool = True, trace_memory: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Timings of every stage at every size, and the reference checks."""
+    # Import what the stages import lazily, so the smallest size is not charged for it
+    for module in ('scipy.stats', 'brfss.anova', 'brfss.bootstrap', 'brfss.correlation'):
+        importlib.import_module(module)
+
+    generator = SyntheticBRFSS()
+    timings: List[pd.DataFrame] = []
+    checks = []
+    with tempfile.TemporaryDirectory() as xport_dir:
+        for n_rows in sizes:
+            size_timings, differences = run_size(n_rows, generator, seed,
+                                                 xport_dir if xport else None, verify, trace_memory)
+            timings.append(size_timings)
+            checks += [{'size': n_rows, 'statistic': name, 'max_abs_diff': value}
+                       for name, value in differences.items()]
+    return pd.concat(timings, ignore_index=True), pd.DataFrame(checks)
+
+
+def to_markdown(timings: pd.DataFrame, checks: pd.DataFrame) -> str:
+    wall = timings.pivot(index='stage', columns='size', values='wall_seconds')
+    wall = wall.loc[timings['stage'].drop_duplicates()]
+    lines = [f"# {REPORT_NAME}", '', '## Wall time (s) per stage', '',
+             '| Stage | ' + ' | '.join(f"{size:,}" for size in wall.columns) + ' |',
+             '|---|' + '---:|' * len(wall.columns)]
+    for stage, row in wall.iterrows():
+        lines.append(f"| {stage} | " + ' | '.join(f"{value:.3f}" for value in row) + ' |')
+    peak = timings.groupby('size')['peak_rss_mb'].max()
+    lines.append('| peak RSS (MB) | ' + ' | '.join(f"{peak[size]:.0f}" for size in wall.columns) + ' |')
+    if len(checks):
+        lines += ['', '## Largest absolute difference to the reference implementation', '',
+                  '| Statistic | ' + ' | '.join(f"{size:,}" for size in wall.columns) + ' |',
+                  '|---|' + '---:|' * len(wall.columns)]
+        table = checks.pivot(index='statistic', columns='size', values='max_abs_diff')
+        for statistic, row in table.iterrows():
+            lines.append(f"| {statistic} | " + ' | '.join(f"{value:.2e}" for value in row) + ' |')
+    return '\n'.join(lines) + '\n'
+
+
+def write_report(timings: pd.DataFrame, checks: pd.DataFrame, directory: str = RESULTS_DIR,
+                 name: str = REPORT_NAME) -> Tuple[str, str]:
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"{name}.json")
+    markdown_path = os.path.join(directory, f"{name}.md")
+    with open(json_path, 'w') as handle:
+        json.dump({'timings': json.loads(timings.to_json(orient='records')),
+                   'checks': json.loads(checks.to_json(orient='records'))}, handle, indent=2)
+    with open(markdown_path, 'w') as handle:
+        handle.write(to_markdown(timings, checks))
+    return json_path, markdown_path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m brfss.benchmark',
+                                     description="Time the pipeline stages on synthetic BRFSS data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="numbers of synthetic records (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--xport', action='store_true',
+                        help="write each size to an XPT file and time the load stage (needs pyreadstat)")
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help="skip the comparison with the reference implementations")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="also record traced allocation peaks (slows stages down)")
+    parser.add_argument('--output-dir', default=RESULTS_DIR,
+                        help="where the report is written (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    timings, checks = run_benchmark(args.sizes, args.seed, args.xport, args.verify, args.tracemalloc)
+    print(to_markdown(timings, checks))
+    for path in write_report(timings, checks, args.output_dir):
+        print(f"[benchmark] written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Repeated undersampling to check the stability of the test results.
+
+The published results come from a single undersampling draw.  This module
+repeats the draw many times, but on the joint count cube of the cleaned data
+rather than on DataFrames: undersampling a class to ``m`` rows without
+replacement is a multivariate hypergeometric draw of ``m`` from the class's
+cell counts, so one replicate is a single ``Generator`` call.  The
+chi-square statistics, the Type II ANOVA and the correlations with the
+target are then evaluated from the replicate cubes (chi-square and
+correlations vectorized across a whole batch of replicates).  Batches run in
+worker processes with independent ``SeedSequence`` streams.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from brfss.anova import cells_from_cube, type2_arrays
+from brfss.contingency import CountCube, chi2_statistic
+from brfss.correlation import cube_patterns
+
+DEFAULT_PAIRS = [
+    ('Age_Group', 'Veteran'),
+    ('Age_Group', 'GeneralHealth'),
+    ('Age_Group', 'Education'),
+    ('MentalHealth', 'Veteran'),
+    ('MentalHealth', 'Age_Group'),
+    ('MentalHealth', 'GeneralHealth'),
+    ('MentalHealth', 'Education'),
+]
+
+
+def undersample_cubes(cube: CountCube, response: str, size: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    """``size`` undersampled copies of ``cube.counts``, stacked on a new first axis.
+
+    Every class of ``response`` is reduced to the smallest class total by
+    drawing cells without replacement.
+    """
+    axis = cube.factors.index(response)
+    by_class = np.moveaxis(cube.counts, axis, 0)
+    class_shape = by_class.shape[1:]
+    by_class = by_class.reshape(by_class.shape[0], -1)
+    target = int(by_class.sum(axis=1).min())
+
+    draws = np.empty((size,) + by_class.shape, dtype=np.int64)
+    for label, cells in enumerate(by_class):
+        if cells.sum() == target:
+            draws[:, label] = cells
+        else:
+            draws[:, label] = rng.multivariate_hypergeometric(cells, target, size=size)
+    draws = draws.reshape((size, by_class.shape[0]) + class_shape)
+    return np.moveaxis(draws, 1, axis + 1)
+
+
+def statistic_names(cube: CountCube, response: str,
+                    pairs: Sequence[Tuple[str, str]]) -> List[str]:
+    names = []
+    for row, column in pairs:
+        names += [f"chi2[{row} x {column}]", f"chi2_p[{row} x {column}]"]
+    for factor in cube.factors:
+        if factor != response:
+            names += [f"anova_F[{factor}]", f"anova_p[{factor}]"]
+    _, columns = cube_patterns(cube, [response])
+    names += [f"corr[{response}, {column}]" for column in columns[1:]]
+    return names
+
+
+def replicate_statistics(cube: CountCube, counts: np.ndarray, response: str,
+                         pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+    """Statistics of each replicate cube in ``counts`` (replicates x statistics)."""
+    n_replicates = counts.shape[0]
+    columns = []
+
+    # Chi-square tests: marginal tables of all replicates at once
+    for row, column in pairs:
+        axes = [cube.factors.index(row), cube.factors.index(column)]
+        others = tuple(1 + axis for axis in range(len(cube.factors)) if axis not in axes)
+        tables = counts.sum(axis=others)
+        if axes[0] > axes[1]:
+            tables = np.swapaxes(tables, 1, 2)
+        statistic, dof, _ = chi2_statistic(tables)
+        columns += [statistic, stats.chi2.sf(statistic, dof)]
+
+    # Type II ANOVA of the response on the other factors (a few small solves each)
+    anova = np.empty((n_replicates, 2 * (len(cube.factors) - 1)))
+    for i in range(n_replicates):
+        cells = cells_from_cube(CountCube(cube.factors, cube.levels, counts[i]), response)
+        _, _, f_value, p_value, _, _ = type2_arrays(cells)
+        anova[i, 0::2] = f_value
+        anova[i, 1::2] = p_value
+    columns += list(anova.T)
+
+    # Correlation of the response with every one-hot column, from the
+    # replicate Gram rows: sum_c n_c * x_c,response * x_c,j
+    patterns, _ = cube_patterns(cube, [response])
+    weights = counts.reshape(n_replicates, -1).astype(np.float64)
+    n = weights.sum(axis=1, keepdims=True)
+    sums = weights @ patterns
+    cross = weights @ (patterns[:, :1] * patterns)
+    squares = weights @ (patterns * patterns)
+    cov = cross - sums[:, :1] * sums / n
+    var = squares - sums * sums / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(var[:, :1] * var)
+    columns += list(corr[:, 1:].T)
+
+    return np.column_stack(columns)
+
+
+def _run_batch(cube: CountCube, response: str, pairs: Sequence[Tuple[str, str]],
+               size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return replicate_statistics(cube, undersample_cubes(cube, response, size, rng),
+                                response, pairs)
+
+
+def bootstrap_replicates(cube: CountCube, response: str = 'MentalHealth',
+                         pairs: Sequence[Tuple[str, str]] = DEFAULT_PAIRS,
+                         replicates: int = 1000, seed: Optional[int] = 1234,
+                         batch_size: int = 250,
+                         max_workers: Optional[int] = None) -> pd.DataFrame:
+    """Statistics of ``replicates`` undersampling draws (one row per draw).
+
+    ``cube`` holds the cleaned, not yet resampled data and must include
+    ``response`` (with numeric levels) and every factor named in ``pairs``.
+    ``max_workers=1`` runs the batches in this process, without a pool.
+    """
+    sizes = [min(batch_size, replicates - start) for start in range(0, replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if max_workers == 1:
+        results = [_run_batch(cube, response, pairs, size, batch_seed)
+                   for size, batch_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run_batch, cube, response, pairs, size, batch_seed)
+                       for size, batch_seed in zip(sizes, seeds)]
+            results = [future.result() for future in futures]
+
+    return pd.DataFrame(np.vstack(results), columns=statistic_names(cube, response, pairs))
+
+
+def confidence_intervals(replicates: pd.DataFrame, alpha: float = 0.05) -> pd.DataFrame:
+    """Mean and percentile interval of every statistic across the replicates."""
+    return pd.DataFrame({
+        'mean': replicates.mean(),
+        'ci_low': replicates.quantile(alpha / 2),
+        'ci_high': replicates.quantile(1 - alpha / 2),
+    })
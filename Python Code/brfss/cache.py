@@ -0,0 +1,85 @@
+"""Columnar on-disk cache for the decoded BRFSS extract and pipeline stages.
+
+Each stage (``raw``, ``BRFSS_1``, ``BRFSS_2``, ``BRFSS_3``) is written as an
+uncompressed Feather (Arrow IPC) file named after a key that hashes the source
+file fingerprint together with the parameters that produced the stage.  When
+nothing changed the next run memory-maps the file instead of parsing the XPT
+file again; when the source or a parameter changes the key changes and the
+stale file is simply never read.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+# Bytes hashed from each end of the source file for its fingerprint
+_FINGERPRINT_SAMPLE = 1 << 20
+
+
+def file_fingerprint(file_path: str) -> str:
+    """Return a cheap fingerprint of ``file_path``.
+
+    Hashes the size, modification time and the first and last megabyte of
+    the file, which catches a replaced or re-downloaded survey file without
+    reading the whole ~700 MB transport file.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(file_path, 'rb') as handle:
+        digest.update(handle.read(_FINGERPRINT_SAMPLE))
+        if stat.st_size > _FINGERPRINT_SAMPLE:
+            handle.seek(max(stat.st_size - _FINGERPRINT_SAMPLE, _FINGERPRINT_SAMPLE))
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+
+def cache_key(*parts: Any, **params: Any) -> str:
+    """Hash fingerprints/upstream keys and stage parameters into a cache key."""
+    payload = json.dumps([parts, params], sort_keys=True, default=repr)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class StageCache:
+    """Feather files under ``cache_dir``, one per (stage, key) pair."""
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+
+    def path(self, stage: str, key: str, suffix: str = 'feather') -> str:
+        return os.path.join(self.cache_dir, f"{stage}-{key}.{suffix}")
+
+    def load(self, stage: str, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached frame, or ``None`` when it has not been stored."""
+        from pyarrow import feather
+
+        path = self.path(stage, key)
+        if not os.path.exists(path):
+            return None
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    def store(self, stage: str, key: str, frame: pd.DataFrame) -> str:
+        """Write ``frame`` atomically and return its path."""
+        from pyarrow import feather
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(stage, key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # Uncompressed so the file can be memory-mapped on the next run
+        feather.write_feather(frame, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        return path
+
+    def get_or_compute(self, stage: str, key: str,
+                       compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Load ``stage`` from the cache, computing and storing it on a miss."""
+        frame = self.load(stage, key)
+        if frame is None:
+            frame = compute()
+            self.store(stage, key, frame)
+        return frame
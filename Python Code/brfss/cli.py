@@ -0,0 +1,104 @@
+"""Command line entry point: ``python -m brfss LLCP2018.XPT --stages clean``."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from brfss.loader import DEFAULT_CHUNK_SIZE, ENGINES
+from brfss.paths import IMAGES_DIR, RESULTS_DIR
+from brfss.pipeline import STAGES, run_stages
+from brfss.profiling import Profiler
+
+OUT_OF_CORE_STAGES = ('chi2', 'anova', 'correlate')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m brfss',
+        description="Run stages of the BRFSS mental health & age analysis.")
+    parser.add_argument('file_path', help="BRFSS XPT file, e.g. LLCP2018.XPT")
+    parser.add_argument('--stages', default='chi2,anova,correlate',
+                        help="comma-separated stages to run (prerequisites are added); "
+                             f"choose from {', '.join(STAGES)} (default: %(default)s)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="records per chunk while reading (default: %(default)s)")
+    parser.add_argument('--engine', choices=ENGINES, default='native',
+                        help="XPT reader: the memory-mapped native decoder or pd.read_sas "
+                             "(default: %(default)s)")
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                        help="keep duplicate survey records")
+    parser.add_argument('--seed', type=int, default=1234,
+                        help="seed of the undersampling draw (default: %(default)s)")
+    parser.add_argument('--cache-dir', help="memoize stage outputs here; later runs recompute only "
+                             "the stages whose inputs or parameters changed")
+    parser.add_argument('--output-dir', help="write each stage result as <stage>.csv here")
+    parser.add_argument('--figures-dir', default=IMAGES_DIR,
+                        help="where the plot stage writes its PNGs (default: %(default)s)")
+    parser.add_argument('--workers', type=int, help="worker processes for the plot stage")
+    parser.add_argument('--profile', metavar='DIR', nargs='?', const=RESULTS_DIR,
+                        help="time each computed stage and write 'Profiling Report' .json/.md "
+                             "to DIR (default: %(const)s)")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="compute chi2, anova and correlate from streamed aggregates in "
+                             "bounded memory (for files larger than RAM)")
+    parser.add_argument('--no-tracemalloc', dest='trace_memory', action='store_false',
+                        help="with --profile, record RSS only (tracemalloc slows stages down)")
+    return parser
+
+
+def _run_out_of_core(args: argparse.Namespace, stages: List[str],
+                     profiler: Optional[Profiler]) -> Dict[str, pd.DataFrame]:
+    from brfss.outofcore import analyze_out_of_core, xport_source
+
+    unsupported = [stage for stage in stages if stage not in OUT_OF_CORE_STAGES]
+    if unsupported:
+        raise ValueError(f"--out-of-core only runs {', '.join(OUT_OF_CORE_STAGES)}; got {unsupported}")
+    if not os.path.exists(args.file_path):
+        raise FileNotFoundError(args.file_path)
+    profiler = profiler or Profiler(trace_memory=False)
+    result = profiler.measure('aggregate', analyze_out_of_core,
+                              xport_source(args.file_path, chunksize=args.chunksize, engine=args.engine),
+                              seed=args.seed, dedup=args.dedup)
+    methods = {'chi2': result.chi_square, 'anova': result.anova, 'correlate': result.correlation}
+    return {stage: profiler.measure(stage, methods[stage]) for stage in stages}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    profiler = Profiler(args.trace_memory) if args.profile else None
+    try:
+        if args.out_of_core:
+            results = _run_out_of_core(args, stages, profiler)
+        else:
+            results = run_stages(args.file_path, stages, chunksize=args.chunksize, dedup=args.dedup,
+                                 seed=args.seed, cache_dir=args.cache_dir,
+                                 figures_dir=args.figures_dir, max_workers=args.workers,
+                                 profiler=profiler, engine=args.engine)
+    except (FileNotFoundError, KeyError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for stage, result in results.items():
+        if stage == 'plot':
+            print(f"[plot] {len(result)} figures written to {args.figures_dir}")
+        elif stage in ('load', 'clean', 'resample'):
+            print(f"[{stage}] {result.shape[0]} rows x {result.shape[1]} columns")
+        else:
+            print(f"[{stage}]\n{result}")
+        if args.output_dir and isinstance(result, pd.DataFrame):
+            result.to_csv(os.path.join(args.output_dir, f"{stage}.csv"),
+                          index=stage in ('anova', 'correlate'))
+
+    if profiler is not None:
+        print(profiler.to_markdown())
+        for path in profiler.write_report(args.profile):
+            print(f"[profile] written to {path}")
+    return 0
@@ -0,0 +1,148 @@
+"""Contingency tables and chi-square tests from one joint count cube.
+
+The categorical columns are encoded as small integer codes and the full
+joint distribution is counted with a single ``np.bincount`` over the
+combined (raveled) index.  Every two-way table, or any other marginal, is
+then a sum over the remaining axes of that cube, so adding another pair of
+variables costs no extra pass over the data.  The chi-square statistics of
+all requested tables are evaluated together on a zero-padded stack of
+tables and agree with ``scipy.stats.chi2_contingency`` (including the Yates
+correction for 2x2 tables).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def encode(column: pd.Series) -> Tuple[np.ndarray, list]:
+    """Integer codes (-1 for missing) and the sorted levels of a column."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), list(column.cat.categories)
+    codes, levels = pd.factorize(column, sort=True)
+    return codes, list(levels)
+
+
+class CountCube:
+    """Joint counts of ``factors``; axis ``i`` is indexed by ``levels[i]``."""
+
+    def __init__(self, factors: Sequence[str], levels: Sequence[list],
+                 counts: np.ndarray) -> None:
+        self.factors = list(factors)
+        self.levels = [list(level) for level in levels]
+        self.counts = counts
+
+    @classmethod
+    def from_codes(cls, factors: Sequence[str], levels: Sequence[list],
+                   codes: Sequence[np.ndarray]) -> 'CountCube':
+        """Count rows of pre-encoded columns; rows with a -1 code are skipped."""
+        shape = tuple(len(level) for level in levels)
+        codes = [np.asarray(code, dtype=np.intp) for code in codes]
+        observed = np.logical_and.reduce([code >= 0 for code in codes])
+        flat = np.ravel_multi_index([code[observed] for code in codes], shape)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(factors, levels, counts)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, factors: Sequence[str]) -> 'CountCube':
+        encoded = [encode(frame[factor]) for factor in factors]
+        return cls.from_codes(factors, [levels for _, levels in encoded],
+                              [codes for codes, _ in encoded])
+
+    def __add__(self, other: 'CountCube') -> 'CountCube':
+        if self.factors != other.factors or self.levels != other.levels:
+            raise ValueError("Cannot add count cubes over different factors or levels")
+        return CountCube(self.factors, self.levels, self.counts + other.counts)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def marginal(self, *factors: str) -> np.ndarray:
+        """Counts over ``factors`` (in that axis order), summing out the rest."""
+        axes = [self.factors.index(factor) for factor in factors]
+        others = tuple(axis for axis in range(len(self.factors)) if axis not in axes)
+        summed = self.counts.sum(axis=others)
+        # Remaining axes are in cube order; reorder them as requested
+        order = np.argsort(np.argsort(axes))
+        return np.transpose(summed, order)
+
+    def table(self, row: str, column: str) -> pd.DataFrame:
+        """Two-way table like ``pd.crosstab`` (empty rows/columns dropped)."""
+        counts = self.marginal(row, column)
+        frame = pd.DataFrame(counts,
+                             index=pd.Index(self.levels[self.factors.index(row)], name=row),
+                             columns=pd.Index(self.levels[self.factors.index(column)], name=column))
+        return frame.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+
+
+class ChiSquareResult(NamedTuple):
+    """Same fields, in the same order, as ``chi2_contingency`` returns."""
+    statistic: float
+    pvalue: float
+    dof: int
+    expected_freq: np.ndarray
+
+
+def chi2_statistic(observed: np.ndarray, correction: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Chi-square statistic, dof and expected counts of a stack of tables.
+
+    ``observed`` has shape ``(..., rows, columns)``; rows or columns that are
+    empty (e.g. zero padding) are left out of the degrees of freedom, as if
+    the table had been cut down to its observed levels.
+    """
+    observed = np.asarray(observed, dtype=np.float64)
+    row_totals = observed.sum(axis=-1, keepdims=True)
+    col_totals = observed.sum(axis=-2, keepdims=True)
+    totals = row_totals.sum(axis=-2, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_totals * col_totals / totals
+    dof = ((row_totals[..., 0] > 0).sum(axis=-1) - 1) * ((col_totals[..., 0, :] > 0).sum(axis=-1) - 1)
+
+    if correction:
+        # Yates' correction for continuity on tables with one degree of freedom
+        diff = expected - observed
+        adjust = np.sign(diff) * np.minimum(0.5, np.abs(diff))
+        observed = np.where((dof == 1)[..., None, None], observed + adjust, observed)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+    return terms.sum(axis=(-2, -1)), dof, expected
+
+
+def chi2_tests(cube: CountCube, pairs: Sequence[Tuple[str, str]],
+               correction: bool = True) -> Dict[Tuple[str, str], ChiSquareResult]:
+    """Pearson chi-square test of independence for every pair of factors."""
+    # Imported here so that encoding and counting do not pay for scipy
+    from scipy import stats
+
+    tables: List[np.ndarray] = [cube.table(row, column).to_numpy(dtype=np.float64)
+                                for row, column in pairs]
+    n_rows = max(table.shape[0] for table in tables)
+    n_cols = max(table.shape[1] for table in tables)
+
+    # Stack the tables, padding with zero rows/columns
+    observed = np.zeros((len(tables), n_rows, n_cols))
+    for i, table in enumerate(tables):
+        observed[i, :table.shape[0], :table.shape[1]] = table
+
+    statistic, dof, expected = chi2_statistic(observed, correction)
+    pvalue = stats.chi2.sf(statistic, dof)
+
+    results = {}
+    for i, (pair, table) in enumerate(zip(pairs, tables)):
+        results[tuple(pair)] = ChiSquareResult(
+            float(statistic[i]), float(pvalue[i]), int(dof[i]),
+            expected[i, :table.shape[0], :table.shape[1]])
+    return results
+
+
+def chi2_summary(results: Dict[Tuple[str, str], ChiSquareResult]) -> pd.DataFrame:
+    """One row per tested pair with the statistic, p-value and degrees of freedom."""
+    return pd.DataFrame(
+        [(row, column, result.statistic, result.pvalue, result.dof)
+         for (row, column), result in results.items()],
+        columns=['row', 'column', 'chi2', 'p', 'dof'])
@@ -0,0 +1,122 @@
+"""Pearson correlation matrix from the Gram matrix of the encoded data.
+
+For a data matrix ``X`` with column sums ``s`` the correlations follow from
+``X^T X`` alone: ``cov = (X^T X - s s^T / n) / (n - 1)``.  On the one-hot
+matrix the columns are 0/1, so ``X^T X`` is just the table of pairwise
+co-occurrence counts and one sparse (or BLAS, for dense input) product
+replaces repeated ``DataFrame.corr()`` calls.  :class:`Correlation` computes
+the matrix once and serves the pair table, the ranking against a target
+variable and top-k subsets from it.
+"""
+
+from __future__ import annotations
+
+from functools import cached_property
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from brfss.contingency import CountCube
+from brfss.encoding import OneHotMatrix
+
+
+def cube_patterns(cube: CountCube, numeric: Sequence[str] = ()) -> Tuple[np.ndarray, List[str]]:
+    """Encoded row of every cell of ``cube``: ``(cells x columns, column names)``.
+
+    Axes listed in ``numeric`` contribute one column holding their (numeric)
+    level; the other axes are one-hot encoded as ``<factor>_<level>``.  The
+    numeric columns come first, like ``pd.get_dummies`` output.
+    """
+    cell_codes = np.indices(cube.counts.shape).reshape(len(cube.factors), -1).T
+    blocks, columns = [], []
+    for axis in [cube.factors.index(name) for name in numeric]:
+        values = np.asarray(cube.levels[axis], dtype=np.float64)
+        blocks.append(values[cell_codes[:, axis]][:, None])
+        columns.append(cube.factors[axis])
+    for axis, (factor, levels) in enumerate(zip(cube.factors, cube.levels)):
+        if factor in numeric:
+            continue
+        blocks.append((cell_codes[:, axis][:, None] == np.arange(len(levels))).astype(np.float64))
+        columns.extend(f"{factor}_{level}" for level in levels)
+    return np.hstack(blocks), columns
+
+
+class Correlation:
+    """Correlation matrix of ``columns`` from ``gram = X^T X``, ``sums`` and ``n``."""
+
+    def __init__(self, gram: np.ndarray, sums: np.ndarray, n: float,
+                 columns: Sequence[str]) -> None:
+        self.gram = np.asarray(gram, dtype=np.float64)
+        self.sums = np.asarray(sums, dtype=np.float64).ravel()
+        self.n = float(n)
+        self.columns = list(columns)
+
+    @classmethod
+    def from_data(cls, data: Union[OneHotMatrix, pd.DataFrame],
+                  weights: Optional[np.ndarray] = None) -> 'Correlation':
+        """Gram matrix of the one-hot matrix or of a numeric frame.
+
+        With ``weights`` (e.g. survey weights) the Gram matrix, the sums and
+        ``n`` are weighted, giving weighted correlations.
+        """
+        if isinstance(data, OneHotMatrix):
+            # Upcast first: uint8 products would overflow
+            matrix = data.matrix.astype(np.float64)
+            columns = data.columns
+        else:
+            matrix = data.to_numpy(dtype=np.float64)
+            columns = data.columns
+        if weights is None:
+            gram = matrix.T @ matrix
+            sums = np.asarray(matrix.sum(axis=0))
+            n = matrix.shape[0]
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            weighted = (sparse.diags(weights) @ matrix if sparse.issparse(matrix)
+                        else matrix * weights[:, None])
+            gram = matrix.T @ weighted
+            sums = np.asarray(weighted.sum(axis=0))
+            n = weights.sum()
+        if sparse.issparse(gram):
+            gram = gram.toarray()
+        return cls(gram, sums, n, columns)
+
+    @classmethod
+    def from_cube(cls, cube: CountCube, numeric: Sequence[str] = ()) -> 'Correlation':
+        """Correlations of the encoded cube columns, weighting each cell by its count."""
+        patterns, columns = cube_patterns(cube, numeric)
+        counts = cube.counts.ravel().astype(np.float64)
+        gram = patterns.T @ (patterns * counts[:, None])
+        return cls(gram, counts @ patterns, counts.sum(), columns)
+
+    @cached_property
+    def matrix(self) -> pd.DataFrame:
+        cov = (self.gram - np.outer(self.sums, self.sums) / self.n) / (self.n - 1)
+        std = np.sqrt(np.diag(cov))
+        # Constant columns have zero variance and get NaN, like DataFrame.corr()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.columns, columns=self.columns)
+
+    @cached_property
+    def pairs(self) -> pd.DataFrame:
+        """Every pair above the diagonal, strongest absolute correlation first."""
+        upper_i, upper_j = np.triu_indices(len(self.columns), k=1)
+        values = self.matrix.to_numpy()[upper_i, upper_j]
+        columns = np.asarray(self.columns, dtype=object)
+        table = pd.DataFrame({'col1': columns[upper_i], 'col2': columns[upper_j],
+                              'corr': values})
+        order = np.argsort(-np.abs(values), kind='stable')
+        return table.iloc[order].reset_index(drop=True)
+
+    def with_target(self, target: str) -> pd.Series:
+        """Absolute correlation of every other column with ``target``, descending."""
+        return self.matrix[target].drop(target).abs().sort_values(ascending=False)
+
+    def top_k(self, target: str, k: int = 10) -> pd.DataFrame:
+        """Correlations of the ``k`` columns most correlated with ``target``."""
+        top = self.with_target(target).index[:k]
+        return self.matrix.loc[top, [target]]
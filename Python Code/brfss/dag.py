@@ -0,0 +1,152 @@
+"""Incremental execution of the analysis as a graph of memoized stages.
+
+Every stage declares the stages it reads and the parameters it takes.  Its
+cache key hashes its name, version and parameters together with the
+*content digests* of its inputs, and its own output is stored in the
+:class:`StageCache` next to a small ``.digest`` file holding the digest of
+that output.  A run therefore works out every key from the digest files
+alone:
+
+- a stage whose key is already on disk is not run, and its inputs are not
+  even loaded unless a recomputed stage downstream needs them;
+- changing a parameter (say the ``Age_Group`` bins of the recode spec)
+  changes that stage's key, so it and only what depends on it are rerun;
+- when a recomputed stage produces exactly the same output as before, the
+  digest is unchanged and everything downstream is reused.
+
+Stage outputs are DataFrames, stored as Feather like the other cached stages.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from brfss.cache import StageCache, cache_key, file_fingerprint
+from brfss.profiling import Profiler
+
+
+class SourceFile(NamedTuple):
+    """A file parameter; its fingerprint, not its path, goes into the key."""
+    path: str
+
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[..., pd.DataFrame]   # called as func(*input frames, **params)
+    inputs: Tuple[str, ...]
+    params: Dict[str, Any]
+    version: str = '1'                  # bump when the function's output changes
+    cache: bool = True                  # False for stages run for their side effects
+
+
+def frame_digest(frame: pd.DataFrame) -> str:
+    """Content hash of a frame: values, index, column names and dtypes."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in frame.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _key_params(params: Mapping[str, Any]) -> Dict[str, Any]:
+    return {name: file_fingerprint(value.path) if isinstance(value, SourceFile) else value
+            for name, value in params.items()}
+
+
+def _call_params(params: Mapping[str, Any]) -> Dict[str, Any]:
+    return {name: value.path if isinstance(value, SourceFile) else value
+            for name, value in params.items()}
+
+
+class StageGraph:
+    """Stages and their dependencies; ``run`` recomputes only what changed.
+
+    Without a ``cache`` every requested stage is computed in memory.  With a
+    ``profiler`` every computed stage is timed and its memory use recorded.
+    """
+
+    def __init__(self, cache: Optional[StageCache] = None,
+                 profiler: Optional[Profiler] = None) -> None:
+        self.cache = cache
+        self.profiler = profiler
+        self.stages: Dict[str, Stage] = {}
+        self.computed: List[str] = []
+        self.reused: List[str] = []
+
+    def add(self, name: str, func: Callable[..., pd.DataFrame], inputs: Sequence[str] = (),
+            params: Optional[Mapping[str, Any]] = None, version: str = '1',
+            cache: bool = True) -> 'StageGraph':
+        missing = [stage for stage in inputs if stage not in self.stages]
+        if missing:
+            raise KeyError(f"Stage {name!r} depends on undefined stages: {missing}")
+        self.stages[name] = Stage(name, func, tuple(inputs), dict(params or {}), version, cache)
+        return self
+
+    def set_params(self, name: str, **params: Any) -> 'StageGraph':
+        """Change parameters of ``name``; the next run recomputes it and its dependents."""
+        stage = self.stages[name]
+        self.stages[name] = stage._replace(params={**stage.params, **params})
+        return self
+
+    def run(self, *targets: str) -> Dict[str, pd.DataFrame]:
+        """Outputs of ``targets`` (every stage when none are given)."""
+        self.computed, self.reused = [], []
+        digests: Dict[str, str] = {}
+        keys: Dict[str, str] = {}
+        frames: Dict[str, pd.DataFrame] = {}
+
+        def resolve(name: str) -> str:
+            # Digest of the output of ``name``, computing it only when not cached
+            if name in digests:
+                return digests[name]
+            stage = self.stages[name]
+            keys[name] = cache_key(name, stage.version, [resolve(stage_input) for stage_input in stage.inputs],
+                                   **_key_params(stage.params))
+            digest = self._stored_digest(stage, keys[name])
+            if digest is None:
+                inputs = [load(stage_input) for stage_input in stage.inputs]
+                if self.profiler is None:
+                    frames[name] = stage.func(*inputs, **_call_params(stage.params))
+                else:
+                    frames[name] = self.profiler.measure(name, stage.func, *inputs,
+                                                         **_call_params(stage.params))
+                if not isinstance(frames[name], pd.DataFrame):
+                    raise TypeError(f"Stage {name!r} must return a DataFrame")
+                digest = frame_digest(frames[name])
+                self._store(stage, keys[name], frames[name], digest)
+                self.computed.append(name)
+            else:
+                self.reused.append(name)
+            digests[name] = digest
+            return digest
+
+        def load(name: str) -> pd.DataFrame:
+            resolve(name)
+            if name not in frames:
+                frames[name] = self.cache.load(name, keys[name])
+            return frames[name]
+
+        return {name: load(name) for name in targets or self.stages}
+
+    def _stored_digest(self, stage: Stage, key: str) -> Optional[str]:
+        if self.cache is None or not stage.cache:
+            return None
+        path = self.cache.path(stage.name, key, 'digest')
+        if not (os.path.exists(path) and os.path.exists(self.cache.path(stage.name, key))):
+            return None
+        with open(path) as handle:
+            return handle.read().strip()
+
+    def _store(self, stage: Stage, key: str, frame: pd.DataFrame, digest: str) -> None:
+        if self.cache is None or not stage.cache:
+            return
+        self.cache.store(stage.name, key, frame)
+        # The digest is written last: a stage counts as cached only once both exist
+        path = self.cache.path(stage.name, key, 'digest')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as handle:
+            handle.write(digest)
+        os.replace(tmp_path, path)
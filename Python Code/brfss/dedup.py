@@ -0,0 +1,114 @@
+"""Global duplicate-record removal over a stream of chunks.
+
+Every record is hashed once with ``pd.util.hash_pandas_object`` into a uint64
+and looked up in the set of hashes kept from earlier chunks, so duplicates are
+dropped across the whole file in a single pass without holding a second copy
+of the survey.  The first occurrence of a record is kept, as with
+``DataFrame.drop_duplicates()``.
+
+The set is an open-addressing hash table (linear probing) in a uint64 array,
+probed for a whole chunk at once.  It is kept at most half full and doubled
+when needed, so a lookup costs a few probes however many chunks came before,
+and the whole file is deduplicated in ``O(n)``.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Slots of a new table; 0 marks an empty slot (the hash 0 is kept aside)
+INITIAL_CAPACITY = 1 << 16
+MAX_LOAD = 0.5
+
+
+class HashSet:
+    """Set of uint64 values in an open-addressing table with linear probing."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+        self._bits = max(1, int(capacity - 1).bit_length())
+        self._table = np.zeros(1 << self._bits, dtype=np.uint64)
+        self._has_zero = False
+        self.size = 0
+
+    def add_new(self, values: np.ndarray) -> np.ndarray:
+        """Add distinct ``values``; True where a value was not in the set before."""
+        values = np.asarray(values, dtype=np.uint64)
+        new = np.zeros(len(values), dtype=bool)
+        zero = values == 0
+        if zero.any():
+            new[zero] = not self._has_zero
+            self._has_zero = True
+        nonzero = np.flatnonzero(~zero)
+        if self.size + len(nonzero) > MAX_LOAD * len(self._table):
+            self._grow(self.size + len(nonzero))
+        inserted = self._insert(values[nonzero])
+        new[nonzero] = inserted
+        self.size += int(inserted.sum())
+        return new
+
+    def _insert(self, values: np.ndarray) -> np.ndarray:
+        # Probe every value at once; the pending ones step to the next slot
+        table, mask = self._table, np.uint64(len(self._table) - 1)
+        inserted = np.zeros(len(values), dtype=bool)
+        pending = np.arange(len(values))
+        slots = values >> np.uint64(64 - self._bits)  # top bits of an already mixed hash
+        while pending.size:
+            current = table[slots]
+            empty = current == 0
+            # Distinct values claiming the same empty slot: the last write wins
+            table[slots[empty]] = values[pending[empty]]
+            won = empty & (table[slots] == values[pending])
+            inserted[pending[won]] = True
+            waiting = ~(won | (current == values[pending]))
+            pending = pending[waiting]
+            slots = (slots[waiting] + np.uint64(1)) & mask
+        return inserted
+
+    def _grow(self, needed: int) -> None:
+        old = self._table[self._table != 0]
+        while needed > MAX_LOAD * (1 << self._bits):
+            self._bits += 1
+        self._table = np.zeros(1 << self._bits, dtype=np.uint64)
+        self._insert(old)
+
+
+class RowDeduplicator:
+    """Drop rows already seen in this or any earlier chunk.
+
+    ``columns`` selects the fields that identify a record; by default every
+    column of the chunk is hashed.  ``rows_in`` and ``duplicates`` count the
+    rows inspected and removed so far.
+    """
+
+    def __init__(self, columns: Optional[Sequence[str]] = None) -> None:
+        self.columns = None if columns is None else list(columns)
+        self.rows_in = 0
+        self.duplicates = 0
+        self._seen = HashSet()
+
+    def keep_mask(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of the rows of ``chunk`` that are seen for the first time."""
+        frame = chunk if self.columns is None else chunk.loc[:, self.columns]
+        return self.keep_hashes(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+
+    def keep_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """:meth:`keep_mask` for records given by their uint64 hashes.
+
+        Used with :meth:`XportFile.record_hashes`, which hashes raw records
+        without decoding them; a deduplicator must see one kind of hash only.
+        """
+        # First occurrence of each record within the chunk, if no earlier chunk had it
+        unique, first = np.unique(hashes, return_index=True)
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[first[self._seen.add_new(unique)]] = True
+
+        self.rows_in += len(hashes)
+        self.duplicates += len(hashes) - int(keep.sum())
+        return keep
+
+    def filter(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Return the rows of ``chunk`` that have not been seen before."""
+        return chunk[self.keep_mask(chunk)]
@@ -0,0 +1,112 @@
+"""Sparse one-hot encoding of the categorical study variables.
+
+:func:`one_hot_encode` builds the same columns as ``pd.get_dummies`` (the
+non-encoded columns first, then ``<variable>_<level>`` in category order)
+directly as a ``scipy.sparse`` CSR matrix of ``uint8``: one stored byte per
+variable per row instead of a dense column per level.  The result keeps the
+variable -> column grouping, so the factor codes can be recovered for the
+ANOVA, and is saved as a single binary ``.npz`` file instead of a 0/1 CSV.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from brfss.contingency import encode
+
+
+class OneHotMatrix:
+    """CSR matrix with column names and the columns belonging to each variable."""
+
+    def __init__(self, matrix: sparse.csr_matrix, columns: Sequence[str],
+                 groups: Dict[str, List[str]], index: Optional[np.ndarray] = None) -> None:
+        self.matrix = matrix.tocsr()
+        self.columns = list(columns)
+        self.groups = {name: list(group) for name, group in groups.items()}
+        self.index = np.arange(matrix.shape[0]) if index is None else np.asarray(index)
+
+    @property
+    def shape(self) -> tuple:
+        return self.matrix.shape
+
+    def column(self, name: str) -> np.ndarray:
+        """Dense values of one column."""
+        position = self.columns.index(name)
+        return self.matrix[:, position].toarray().ravel()
+
+    def levels(self, variable: str) -> list:
+        prefix = f"{variable}_"
+        return [column[len(prefix):] for column in self.groups[variable]]
+
+    def factor_codes(self, variable: str) -> np.ndarray:
+        """Level code of ``variable`` per row (-1 where no level is set)."""
+        positions = [self.columns.index(column) for column in self.groups[variable]]
+        block = self.matrix[:, positions].tocsr()
+        codes = np.full(block.shape[0], -1, dtype=np.intp)
+        has_level = np.diff(block.indptr) > 0
+        codes[has_level] = block.indices[block.indptr[:-1][has_level]]
+        return codes
+
+    def to_frame(self, sparse_columns: bool = False) -> pd.DataFrame:
+        """DataFrame with ``uint8`` (or ``Sparse[uint8]``) columns."""
+        if sparse_columns:
+            return pd.DataFrame.sparse.from_spmatrix(self.matrix, index=self.index,
+                                                     columns=self.columns)
+        return pd.DataFrame(self.matrix.toarray(), index=self.index, columns=self.columns)
+
+    def save(self, path: str) -> None:
+        """Write the matrix and its metadata to one compressed ``.npz`` file."""
+        np.savez_compressed(
+            path, data=self.matrix.data, indices=self.matrix.indices,
+            indptr=self.matrix.indptr, shape=np.array(self.matrix.shape),
+            index=self.index,
+            meta=np.array(json.dumps({'columns': self.columns, 'groups': self.groups})))
+
+    @classmethod
+    def load(cls, path: str) -> 'OneHotMatrix':
+        with np.load(path, allow_pickle=False) as stored:
+            matrix = sparse.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']),
+                shape=tuple(stored['shape']))
+            meta = json.loads(str(stored['meta']))
+            return cls(matrix, meta['columns'], meta['groups'], stored['index'])
+
+
+def one_hot_encode(frame: pd.DataFrame, columns: Sequence[str]) -> OneHotMatrix:
+    """One-hot encode ``columns``; the other (numeric) columns are passed through.
+
+    Passed-through columns must hold small non-negative integers (such as the
+    0/1 ``MentalHealth`` target), since the matrix is stored as ``uint8``.
+    """
+    passthrough = [column for column in frame.columns if column not in columns]
+    n_rows = len(frame)
+    rows, cols, values = [], [], []
+    names: List[str] = []
+    groups: Dict[str, List[str]] = {}
+
+    for column in passthrough:
+        data = frame[column].to_numpy()
+        nonzero = np.flatnonzero(data)
+        rows.append(nonzero)
+        cols.append(np.full(len(nonzero), len(names)))
+        values.append(data[nonzero].astype(np.uint8))
+        names.append(column)
+
+    for column in columns:
+        codes, levels = encode(frame[column])
+        observed = np.flatnonzero(codes >= 0)
+        rows.append(observed)
+        cols.append(len(names) + codes[observed])
+        values.append(np.ones(len(observed), dtype=np.uint8))
+        groups[column] = [f"{column}_{level}" for level in levels]
+        names.extend(groups[column])
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, len(names)), dtype=np.uint8)
+    return OneHotMatrix(matrix, names, groups, frame.index.to_numpy())
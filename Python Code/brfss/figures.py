@@ -0,0 +1,171 @@
+"""Headless figure pipeline: aggregate once, render in parallel, write PNGs.
+
+Each figure is described by a :class:`FigureSpec` holding only the numbers
+that are drawn: histogram counts from ``np.histogram`` (or per-level counts
+for categorical columns), bar heights, or a small matrix for heatmaps.  The
+full data never reaches the plotting code, so the specs are cheap to send to
+worker processes.  :func:`render_figures` draws every spec on the Agg backend
+in a process pool (no ``pyplot`` state, nothing blocks on a display) and
+writes the PNGs together with a JSON manifest describing them.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from brfss.contingency import encode
+from brfss.paths import IMAGES_DIR
+
+DEFAULT_DIRECTORY = IMAGES_DIR
+MANIFEST = 'manifest.json'
+
+
+class FigureSpec(NamedTuple):
+    name: str                        # file stem, also the manifest key
+    kind: str                        # 'hist', 'bar', 'heatmap' or 'trend'
+    data: Dict[str, object]          # pre-aggregated arrays to draw
+    title: str
+    xlabel: str = ''
+    ylabel: str = ''
+    options: Optional[Dict[str, object]] = None
+
+
+def histogram(column: pd.Series, bins: int = 9, name: Optional[str] = None) -> FigureSpec:
+    """Histogram of a numeric column, or a bar per level of a categorical one."""
+    title = f"Histogram of {column.name} Variable"
+    if isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object:
+        codes, levels = encode(column)
+        counts = np.bincount(codes[codes >= 0], minlength=len(levels))
+        return bar(name or title, [str(level) for level in levels], counts, title,
+                   xlabel=str(column.name), ylabel='Frequency')
+    values = column.to_numpy(dtype=np.float64)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return FigureSpec(name or title, 'hist', {'counts': counts, 'edges': edges}, title,
+                      str(column.name), 'Frequency')
+
+
+def count_bar(column: pd.Series, name: str, title: str, xlabel: str = '',
+              ylabel: str = 'Count', rotation: int = 0) -> FigureSpec:
+    """Bar chart of the number of rows per level of ``column``."""
+    codes, levels = encode(column)
+    counts = np.bincount(codes[codes >= 0], minlength=len(levels))
+    return bar(name, [str(level) for level in levels], counts, title, xlabel, ylabel, rotation)
+
+
+def bar(name: str, labels: Sequence[str], values: Sequence[float], title: str,
+        xlabel: str = '', ylabel: str = '', rotation: int = 0) -> FigureSpec:
+    return FigureSpec(name, 'bar', {'labels': list(labels), 'values': np.asarray(values)},
+                      title, xlabel, ylabel, {'rotation': rotation})
+
+
+def heatmap(name: str, frame: pd.DataFrame, title: str, xlabel: str = '', ylabel: str = '',
+            fmt: str = '.2f', cmap: str = 'RdBu', linewidths: float = 0.0) -> FigureSpec:
+    """Annotated heatmap of a (small) matrix such as a correlation table."""
+    return FigureSpec(name, 'heatmap',
+                      {'values': frame.to_numpy(dtype=np.float64),
+                       'rows': [str(label) for label in frame.index],
+                       'columns': [str(label) for label in frame.columns]},
+                      title, xlabel, ylabel,
+                      {'fmt': fmt, 'cmap': cmap, 'linewidths': linewidths})
+
+
+def trend(name: str, table: pd.DataFrame, title: str, xlabel: str = 'Age',
+          ylabel: str = 'Prevalence') -> FigureSpec:
+    """Prevalence per age with its interval band and smoothed curve (see :func:`age_trend`)."""
+    return FigureSpec(name, 'trend',
+                      {column: table[column].to_numpy(dtype=np.float64)
+                       for column in ('age', 'prevalence', 'lower', 'upper', 'smoothed')},
+                      title, xlabel, ylabel)
+
+
+def file_name(spec: FigureSpec) -> str:
+    return re.sub(r"[^\w\-. ()']+", '_', spec.name) + '.png'
+
+
+def _draw(spec: FigureSpec, axes) -> None:
+    options = spec.options or {}
+    if spec.kind == 'hist':
+        edges = spec.data['edges']
+        axes.bar(edges[:-1], spec.data['counts'], width=np.diff(edges), align='edge',
+                 color='steelblue', edgecolor='black')
+    elif spec.kind == 'bar':
+        positions = np.arange(len(spec.data['labels']))
+        axes.bar(positions, spec.data['values'], color='steelblue', edgecolor='black')
+        rotation = options.get('rotation', 0)
+        axes.set_xticks(positions)
+        axes.set_xticklabels(spec.data['labels'], rotation=rotation,
+                             ha='right' if rotation else 'center')
+    elif spec.kind == 'heatmap':
+        values = spec.data['values']
+        limit = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1.0
+        image = axes.pcolormesh(values, cmap=options['cmap'], vmin=-limit, vmax=limit,
+                                edgecolor='white', linewidth=options['linewidths'])
+        axes.figure.colorbar(image, ax=axes)
+        axes.set_xticks(np.arange(values.shape[1]) + 0.5)
+        axes.set_xticklabels(spec.data['columns'], rotation=90)
+        axes.set_yticks(np.arange(values.shape[0]) + 0.5)
+        axes.set_yticklabels(spec.data['rows'])
+        axes.invert_yaxis()
+        for (i, j), value in np.ndenumerate(values):
+            if np.isfinite(value):
+                axes.text(j + 0.5, i + 0.5, format(value, options['fmt']), ha='center', va='center',
+                          color='white' if abs(value) > 0.6 * limit else 'black', fontsize=8)
+    elif spec.kind == 'trend':
+        ages = spec.data['age']
+        axes.fill_between(ages, spec.data['lower'], spec.data['upper'], color='steelblue', alpha=0.25,
+                          label='95% interval')
+        axes.plot(ages, spec.data['prevalence'], 'o', color='steelblue', markersize=3, label='Observed')
+        if np.isfinite(spec.data['smoothed']).any():
+            axes.plot(ages, spec.data['smoothed'], color='darkred', label='Smoothed')
+        axes.legend()
+    else:
+        raise ValueError(f"Unknown figure kind {spec.kind!r}")
+
+
+def render_figure(spec: FigureSpec, directory: str = DEFAULT_DIRECTORY, dpi: int = 100) -> str:
+    """Draw ``spec`` with the Agg canvas and save it; returns the file name."""
+    # Figure objects without pyplot render on Agg and never touch a display
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 8) if spec.kind == 'heatmap' else (10, 6))
+    axes = figure.add_subplot()
+    _draw(spec, axes)
+    axes.set_title(spec.title)
+    axes.set_xlabel(spec.xlabel)
+    axes.set_ylabel(spec.ylabel)
+    figure.tight_layout()
+    name = file_name(spec)
+    figure.savefig(os.path.join(directory, name), dpi=dpi)
+    return name
+
+
+def render_figures(specs: Sequence[FigureSpec], directory: str = DEFAULT_DIRECTORY,
+                   dpi: int = 100, max_workers: Optional[int] = None) -> List[Dict[str, str]]:
+    """Render every spec in a process pool and write ``manifest.json`` next to the PNGs.
+
+    ``max_workers=1`` renders in this process, without a pool.
+    """
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Figure names must be unique")
+    os.makedirs(directory, exist_ok=True)
+
+    if max_workers == 1:
+        files = [render_figure(spec, directory, dpi) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            files = list(executor.map(render_figure, specs, [directory] * len(specs),
+                                      [dpi] * len(specs)))
+
+    manifest = [{'name': spec.name, 'file': file, 'kind': spec.kind, 'title': spec.title}
+                for spec, file in zip(specs, files)]
+    with open(os.path.join(directory, MANIFEST), 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
@@ -0,0 +1,212 @@
+"""Multi-year BRFSS ingestion with parallel decoding.
+
+Each survey year is one ``LLCP<year>.XPT`` file.  The files are split into
+row ranges (XPORT records are fixed-width, so a range starts at a known byte
+offset) and the ranges are decoded in a ``ProcessPoolExecutor``: decoding is
+CPU-bound, so this scales with the number of cores.  The result is one
+frame tagged with ``YEAR``.
+
+Variables are read under their 2018 names.  ``YEAR_VARIABLES`` maps a
+year's raw name back to the analysis name where it differs, but it ships
+empty: no rename has been checked against the codebooks of other years yet,
+and some study variables (e.g. the calculated ``_AGE80`` and ``_MENT14D``)
+are not in every year's file at all.  A year whose file lacks a variable is
+reported, with all other such years, before anything is decoded; add its
+codebook name to ``YEAR_VARIABLES`` (or pass ``year_variables``) to read it.
+
+Duplicate records are removed per file with whole-record hashes, as in
+:func:`~brfss.loader.iter_brfss_chunks`: the workers return the hashes of the
+full records next to the projected columns and the parent keeps the first
+occurrence of each.  With the default ``engine='native'`` the workers
+memory-map the file (:class:`~brfss.xport.XportFile`) and hash raw records.
+With ``engine='pandas'`` each worker gives ``pd.read_sas`` a file view made
+of the header and the records of its range (:class:`RecordRange`), so only
+the public chunked reader is used.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from brfss.loader import DEFAULT_CHUNK_SIZE, ENGINES, VARIABLES_TO_KEEP, downcast
+from brfss.xport import CARD, XportFile
+
+# Rows decoded by one worker task
+DEFAULT_ROWS_PER_TASK = 100000
+
+# Raw variable name per analysis variable for the years where it differs
+# from the 2018 name, e.g. {2011: {'VETERAN3': '<name in 2011>'}}.  Years and
+# variables not listed use the analysis name unchanged.  Only add names
+# checked against that year's codebook.
+YEAR_VARIABLES: Dict[int, Dict[str, str]] = {}
+
+
+def year_of(file_path: str) -> int:
+    """Survey year from a file name such as ``LLCP2018.XPT``."""
+    match = re.search(r'(\d{4})', os.path.basename(file_path))
+    if match is None:
+        raise ValueError(f"Cannot tell the survey year of {file_path}; pass a {{year: path}} mapping")
+    return int(match.group(1))
+
+
+def raw_columns(year: int, columns: Sequence[str],
+                year_variables: Mapping[int, Mapping[str, str]] = YEAR_VARIABLES) -> Dict[str, str]:
+    """``{raw name: analysis name}`` for the requested columns of ``year``."""
+    renames = year_variables.get(year, {})
+    return {renames.get(column, column): column for column in columns}
+
+
+def _read_header(file_path: str) -> Tuple[int, List[str]]:
+    with XportFile(file_path) as xport:
+        return xport.nobs, list(xport.columns)
+
+
+class RecordRange(io.RawIOBase):
+    """Read-only view of an XPT file holding only records ``[start, stop)``.
+
+    The view is the file's header, then the records of the range, then blank
+    padding to a whole card, so ``pd.read_sas`` reads it as a complete
+    transport file.  Offsets come from the header parsed by :class:`XportFile`.
+    """
+
+    def __init__(self, file_path: str, start: int, stop: int) -> None:
+        super().__init__()
+        with XportFile(file_path) as xport:
+            self._header_end = xport.record_start
+            self._records_offset = xport.record_start + start * xport.record_length
+            self._records_end = xport.record_start + (stop - start) * xport.record_length
+        self._size = self._records_end + -self._records_end % CARD
+        self._file = open(file_path, 'rb')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        wanted = max(0, min(len(view), self._size - self._position))
+        filled = 0
+        while filled < wanted:
+            position = self._position
+            if position < self._header_end:
+                file_position, available = position, self._header_end - position
+            elif position < self._records_end:
+                file_position = self._records_offset + position - self._header_end
+                available = self._records_end - position
+            else:
+                view[filled:wanted] = b' ' * (wanted - filled)
+                self._position += wanted - filled
+                return wanted
+            self._file.seek(file_position)
+            count = self._file.readinto(view[filled:filled + min(available, wanted - filled)])
+            if not count:
+                break
+            filled += count
+            self._position += count
+        return filled
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+def _decode_range(file_path: str, columns: Dict[str, str], start: int, stop: int,
+                  chunksize: int, dedup: bool,
+                  engine: str = 'native') -> Tuple[pd.DataFrame, Optional[np.ndarray]]:
+    """Decode records ``[start, stop)`` of one file (runs in a worker process)."""
+    frames, hashes = [], []
+    if engine == 'native':
+        with XportFile(file_path) as xport:
+            for position in range(start, stop, chunksize):
+                end = min(position + chunksize, stop)
+                if dedup:
+                    hashes.append(xport.record_hashes(position, end))
+                frames.append(downcast(xport.read(list(columns), position, end).rename(columns=columns)))
+        return (pd.concat(frames),
+                np.concatenate(hashes) if dedup else None)
+
+    # Records are fixed-width: the reader sees only the records of the range
+    with RecordRange(file_path, start, stop) as records, \
+            pd.read_sas(records, format='xport', chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk.index += start
+            if dedup:
+                hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+            frames.append(downcast(chunk.loc[:, list(columns)].rename(columns=columns)))
+    return (pd.concat(frames),
+            np.concatenate(hashes) if dedup else None)
+
+
+def ingest_years(files: Union[Sequence[str], Mapping[int, str]],
+                 columns: Optional[Sequence[str]] = None,
+                 rows_per_task: int = DEFAULT_ROWS_PER_TASK,
+                 chunksize: int = DEFAULT_CHUNK_SIZE,
+                 max_workers: Optional[int] = None,
+                 dedup: bool = True,
+                 year_variables: Mapping[int, Mapping[str, str]] = YEAR_VARIABLES,
+                 engine: str = 'native',
+                 ) -> pd.DataFrame:
+    """Decode several survey years in parallel into one year-tagged frame.
+
+    ``files`` is a list of XPT paths (the year is taken from the file name)
+    or a ``{year: path}`` mapping.  The result has the requested analysis
+    ``columns`` plus ``YEAR``, ordered by year and record number.
+    """
+    columns = list(VARIABLES_TO_KEEP if columns is None else columns)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; choose from {', '.join(ENGINES)}")
+    if not isinstance(files, Mapping):
+        files = {year_of(path): path for path in files}
+
+    tasks, missing = [], {}
+    for year, path in sorted(files.items()):
+        nobs, available = _read_header(path)
+        renames = raw_columns(year, columns, year_variables)
+        absent = [raw for raw in renames if raw not in available]
+        if absent:
+            missing[year] = (path, absent, renames[absent[0]])
+        for start in range(0, nobs, rows_per_task):
+            tasks.append((year, path, renames, start, min(start + rows_per_task, nobs)))
+    if missing:
+        found = '; '.join(f"{path} ({year}): {absent}" for year, (path, absent, _) in missing.items())
+        year = min(missing)
+        example = f"{{{year}: {{'{missing[year][2]}': '<name in {year}>'}}}}"
+        raise KeyError(f"Columns not found in {found}. Add each year's codebook name to "
+                       f"brfss.ingest.YEAR_VARIABLES or pass year_variables, e.g. {example}")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_decode_range, path, renames, start, stop, chunksize, dedup,
+                                   engine)
+                   for _, path, renames, start, stop in tasks]
+        results = [future.result() for future in futures]
+
+    years = []
+    for year in sorted(files):
+        parts = [result for task, result in zip(tasks, results) if task[0] == year]
+        frame = pd.concat([part for part, _ in parts])
+        if dedup:
+            # First occurrence of each whole record within the year's file
+            _, first = np.unique(np.concatenate([part_hashes for _, part_hashes in parts]),
+                                 return_index=True)
+            frame = frame.iloc[np.sort(first)]
+        years.append(frame.assign(YEAR=np.int16(year)))
+    return pd.concat(years, ignore_index=True)
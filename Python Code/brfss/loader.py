@@ -0,0 +1,112 @@
+"""Streaming reader for the BRFSS SAS transport (XPT) file.
+
+``pd.read_sas`` on ``LLCP2018.XPT`` decodes all ~275 survey columns for every
+respondent before the analysis keeps five of them.  The reader below walks the
+file in record batches instead, keeps only the requested columns of each batch
+and downcasts them straight away, so peak memory follows the kept columns
+rather than the full survey.  Duplicate survey records can be dropped on the
+way through with a :class:`~brfss.dedup.RowDeduplicator`.
+
+The default ``engine='native'`` reads the file with :class:`~brfss.xport.XportFile`,
+which decodes only the kept columns and finds duplicates by hashing the raw
+records; ``engine='pandas'`` goes through ``pd.read_sas``.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from brfss.dedup import RowDeduplicator
+from brfss.xport import XportFile
+
+# Variables used in this study (see the codebook)
+VARIABLES_TO_KEEP = ['VETERAN3', 'GENHLTH', 'EDUCA', '_AGE80', '_MENT14D']
+
+# Survey design: final weight, stratum and primary sampling unit
+DESIGN_VARIABLES = ['_LLCPWT', '_STSTR', '_PSU']
+
+# Same batch size the original notebook used for its chunked dedup
+DEFAULT_CHUNK_SIZE = 10000
+
+ENGINES = ('native', 'pandas')
+
+# Part of every cache key of loaded data: bump when decoding, downcasting or
+# deduplication changes the frames this module returns
+LOADER_VERSION = '1'
+
+
+def downcast(frame: pd.DataFrame) -> pd.DataFrame:
+    # BRFSS codes are small integers stored as SAS doubles; blanks decode to
+    # NaN, so float32 keeps the missing values while halving the footprint.
+    # The design variables stay float64: weights need the precision and the
+    # 10-digit PSU ids are not exact in float32.
+    for column in frame.columns:
+        if frame[column].dtype == np.float64 and column not in DESIGN_VARIABLES:
+            frame[column] = frame[column].astype(np.float32)
+    return frame
+
+
+def iter_brfss_chunks(file_path: str,
+                      columns: Optional[Sequence[str]] = None,
+                      chunksize: int = DEFAULT_CHUNK_SIZE,
+                      dedup: Optional[RowDeduplicator] = None,
+                      engine: str = 'native',
+                      ) -> Iterator[pd.DataFrame]:
+    """Yield the XPT file in batches of ``chunksize`` records.
+
+    Each batch is projected to ``columns`` (default: ``VARIABLES_TO_KEEP``)
+    and downcast before it is handed out, so only one full-width batch is
+    alive at any time.  The index is the record number in the file.
+
+    When ``dedup`` is given, duplicate records are removed before the
+    projection, i.e. a record is a duplicate only if every field of the
+    survey matches (unless the deduplicator names its own columns).
+    """
+    columns = list(VARIABLES_TO_KEEP if columns is None else columns)
+    if engine == 'native':
+        yield from _iter_native_chunks(file_path, columns, chunksize, dedup)
+        return
+    if engine != 'pandas':
+        raise ValueError(f"Unknown engine {engine!r}; choose from {', '.join(ENGINES)}")
+
+    with pd.read_sas(file_path, format='xport', iterator=True,
+                     chunksize=chunksize) as reader:
+        missing = [column for column in columns if column not in reader.columns]
+        if missing:
+            raise KeyError(f"Columns not found in {file_path}: {missing}")
+
+        for chunk in reader:
+            if dedup is not None:
+                chunk = dedup.filter(chunk)
+            yield downcast(chunk.loc[:, columns].copy())
+
+
+def _iter_native_chunks(file_path: str, columns: Sequence[str], chunksize: int,
+                        dedup: Optional[RowDeduplicator]) -> Iterator[pd.DataFrame]:
+    with XportFile(file_path) as xport:
+        missing = [column for column in columns if column not in xport.columns]
+        if missing:
+            raise KeyError(f"Columns not found in {file_path}: {missing}")
+
+        for start in range(0, xport.nobs, chunksize):
+            stop = min(start + chunksize, xport.nobs)
+            chunk = xport.read(columns, start, stop)
+            if dedup is not None:
+                if dedup.columns is None:
+                    keep = dedup.keep_hashes(xport.record_hashes(start, stop))
+                else:
+                    keep = dedup.keep_mask(xport.read(dedup.columns, start, stop))
+                chunk = chunk[keep]
+            yield downcast(chunk)
+
+
+def load_brfss(file_path: str,
+               columns: Optional[Sequence[str]] = None,
+               chunksize: int = DEFAULT_CHUNK_SIZE,
+               dedup: Optional[RowDeduplicator] = None,
+               engine: str = 'native') -> pd.DataFrame:
+    """Read the projected, downcast columns of the XPT file into one frame."""
+    return pd.concat(iter_brfss_chunks(file_path, columns, chunksize, dedup, engine))
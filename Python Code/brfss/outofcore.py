@@ -0,0 +1,193 @@
+"""Out-of-core analysis: streaming passes and merged aggregates.
+
+Nothing here holds more than one chunk of records in memory.  Every analysis
+result of the pipeline is a function of small aggregates, so the file is
+streamed and only those aggregates are merged:
+
+1. **Medians.** One pass with :class:`StreamingStats` over the raw chunks
+   gives the exact medians used for imputation (the code columns have only a
+   few distinct values) and the summary table.
+2. **Cleaning and counting.** A second pass cleans every chunk with those
+   medians and the validity rules and recodes it. It adds the chunk to the
+   joint :class:`CountCube` of the study variables and spools the cell
+   number of every cleaned row to a memory-mapped file (one byte per row
+   while the cube has at most 256 cells, more for finer recodes).
+3. **Undersampling.** The class sizes come from the cube.  The same
+   ``Generator.choice`` calls as :func:`resample_indices` select which
+   ranks of each class are kept, and the spooled cell numbers are scanned
+   block by block to count the kept rows into the resampled cube.
+
+Chi-square tests, the Type II ANOVA (its sufficient statistics are cube
+margins) and the correlation Gram matrix are then computed from the
+resampled cube.  For the same records and seed the results are the ones the
+in-memory pipeline gets from ``BRFSS_2``.  Duplicates are removed in
+every pass by a fresh :class:`RowDeduplicator`, whose memory is 16 to 32
+bytes per distinct record; the undersampling keeps one cell number per row
+of the larger classes.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from brfss.contingency import CountCube
+from brfss.dedup import RowDeduplicator
+from brfss.loader import DEFAULT_CHUNK_SIZE, DESIGN_VARIABLES, VARIABLES_TO_KEEP, iter_brfss_chunks
+from brfss.pipeline import FACTORS, IMPUTED, RESPONSE, clean
+from brfss.recode import RECODE_SPEC, label_categories
+from brfss.resample import SeedLike
+from brfss.stats import StreamingStats
+
+# A source yields the raw chunks again on every call, filtered by ``dedup`` when given
+ChunkSource = Callable[[Optional[RowDeduplicator]], Iterable[pd.DataFrame]]
+
+# Rows of spooled cell numbers scanned at a time
+BLOCK_SIZE = 1 << 22
+
+
+def xport_source(*file_paths: str, chunksize: int = DEFAULT_CHUNK_SIZE,
+                 columns: Sequence[str] = VARIABLES_TO_KEEP + DESIGN_VARIABLES,
+                 engine: str = 'native') -> ChunkSource:
+    """Chunks of one or more XPT files (e.g. pooled survey years), in order."""
+    def chunks(dedup: Optional[RowDeduplicator]) -> Iterator[pd.DataFrame]:
+        for file_path in file_paths:
+            yield from iter_brfss_chunks(file_path, columns, chunksize, dedup, engine)
+    return chunks
+
+
+def frame_source(frames: Callable[[], Iterable[pd.DataFrame]]) -> ChunkSource:
+    """Wrap a re-iterable chunk generator, e.g. ``SyntheticBRFSS.iter_chunks``."""
+    def chunks(dedup: Optional[RowDeduplicator]) -> Iterator[pd.DataFrame]:
+        for chunk in frames():
+            yield chunk if dedup is None else dedup.filter(chunk)
+    return chunks
+
+
+class OutOfCoreResult(NamedTuple):
+    rows_in: int              # records read, duplicates included
+    duplicates: int
+    medians: Dict[str, float]
+    summary: pd.DataFrame     # StreamingStats.describe() of the raw study variables
+    cleaned: CountCube        # joint counts of BRFSS_1
+    resampled: CountCube      # joint counts of BRFSS_2
+
+    def chi_square(self, pairs: Optional[Sequence[Tuple[str, str]]] = None) -> pd.DataFrame:
+        from brfss.bootstrap import DEFAULT_PAIRS
+        from brfss.contingency import chi2_summary, chi2_tests
+
+        return chi2_summary(chi2_tests(self.resampled, pairs or DEFAULT_PAIRS))
+
+    def anova(self) -> pd.DataFrame:
+        from brfss.anova import anova_type2_from_cells, cells_from_cube
+
+        return anova_type2_from_cells(cells_from_cube(self.resampled, RESPONSE))
+
+    def correlation(self) -> pd.DataFrame:
+        from brfss.correlation import Correlation
+
+        return Correlation.from_cube(self.resampled, numeric=[RESPONSE]).matrix
+
+
+def _cube_codes(frame: pd.DataFrame, factors: Sequence[str], levels: Sequence[list]) -> List[np.ndarray]:
+    # Level codes against the spec's fixed levels, so every chunk shares one cube layout
+    codes = []
+    for factor, factor_levels in zip(factors, levels):
+        column = frame[factor]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes.append(column.cat.codes.to_numpy())
+        else:
+            codes.append(np.searchsorted(np.asarray(factor_levels), column.to_numpy()))
+    return codes
+
+
+def spool_dtype(n_cells: int) -> np.dtype:
+    """Smallest unsigned integer type holding the cell numbers of a cube of ``n_cells``."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_cells <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    raise ValueError(f"A cube of {n_cells} cells is too large to spool")
+
+
+def analyze_out_of_core(source: ChunkSource, spec: Mapping[str, Mapping] = RECODE_SPEC,
+                        method: str = 'under', seed: SeedLike = 1234, dedup: bool = True,
+                        spool_dir: Optional[str] = None) -> OutOfCoreResult:
+    """Clean, count and undersample ``source`` in bounded memory."""
+    if method != 'under':
+        raise ValueError("The out-of-core path only supports method='under'")
+
+    # Pass 1: medians for the imputation and the summary statistics
+    deduplicator = RowDeduplicator() if dedup else None
+    summary = StreamingStats(VARIABLES_TO_KEEP)
+    rows_kept = 0
+    for chunk in source(deduplicator):
+        summary.update(chunk)
+        rows_kept += len(chunk)
+    medians = {column: float(summary.quantile(0.5)[column]) for column in IMPUTED}
+    rows_in = deduplicator.rows_in if dedup else rows_kept
+    duplicates = deduplicator.duplicates if dedup else 0
+
+    # Pass 2: clean each chunk, count it and spool the cell number of every row
+    factors = FACTORS + [RESPONSE]
+    levels = [label_categories(spec[factor]) for factor in factors]
+    shape = tuple(len(level) for level in levels)
+    counts = np.zeros(shape, dtype=np.int64)
+    n_clean = 0
+    dtype = spool_dtype(counts.size)
+    with tempfile.TemporaryDirectory(dir=spool_dir) as directory:
+        spool_path = os.path.join(directory, f"cells.{dtype.name}")
+        with open(spool_path, 'wb') as spool:
+            for chunk in source(RowDeduplicator() if dedup else None):
+                cleaned = clean(chunk, spec, medians)
+                cells = np.ravel_multi_index(_cube_codes(cleaned, factors, levels), shape)
+                counts += np.bincount(cells, minlength=counts.size).reshape(shape)
+                spool.write(cells.astype(dtype).tobytes())
+                n_clean += len(cells)
+        cleaned_cube = CountCube(factors, levels, counts)
+
+        # Pass 3: undersample by class rank over the spooled cells
+        cells = (np.memmap(spool_path, dtype=dtype, mode='r') if n_clean
+                 else np.empty(0, dtype=dtype))
+        resampled = _undersample(cleaned_cube, cells, seed)
+        del cells
+
+    return OutOfCoreResult(rows_in, duplicates, medians, summary.describe(), cleaned_cube,
+                           CountCube(factors, levels, resampled))
+
+
+def _undersample(cube: CountCube, cells: np.ndarray, seed: SeedLike) -> np.ndarray:
+    """Counts of the rows ``resample_indices(..., method='under')`` would keep."""
+    rng = np.random.default_rng(seed)
+    axis = cube.factors.index(RESPONSE)
+    class_sizes = cube.marginal(RESPONSE)
+    label_of_cell = np.indices(cube.counts.shape)[axis].ravel()
+
+    # Same draws, in the same order, as resample_indices: ranks kept per class
+    present = np.flatnonzero(class_sizes > 0)
+    target = class_sizes[present].min() if len(present) else 0
+    keep: Dict[int, Optional[np.ndarray]] = {}
+    for label in present:
+        chosen = rng.choice(class_sizes[label], target, replace=False)
+        if target == class_sizes[label]:
+            keep[label] = None   # every row of the smallest class is kept
+        else:
+            keep[label] = np.zeros(class_sizes[label], dtype=bool)
+            keep[label][chosen] = True
+
+    counts = np.zeros(cube.counts.size, dtype=np.int64)
+    seen = np.zeros(len(class_sizes), dtype=np.int64)
+    for start in range(0, len(cells), BLOCK_SIZE):
+        block = np.asarray(cells[start:start + BLOCK_SIZE], dtype=np.intp)
+        labels = label_of_cell[block]
+        selected = np.zeros(len(block), dtype=bool)
+        for label in present:
+            rows = np.flatnonzero(labels == label)
+            ranks = seen[label] + np.arange(len(rows))
+            selected[rows] = True if keep[label] is None else keep[label][ranks]
+            seen[label] += len(rows)
+        counts += np.bincount(block[selected], minlength=counts.size)
+    return counts.reshape(cube.counts.shape)
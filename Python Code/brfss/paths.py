@@ -0,0 +1,16 @@
+"""Locations in the repository that the package reads and writes.
+
+They are resolved from the package directory, not the working directory, so
+``python -m brfss`` writes next to ``Results/Summary Statistics.md`` whether
+it is run from ``Python Code/``, the repository root or anywhere else.
+"""
+
+from __future__ import annotations
+
+import os
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          os.pardir, os.pardir))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'Results')
+IMAGES_DIR = os.path.join(RESULTS_DIR, 'Images')
+CLEANED_CSV = os.path.join(REPO_ROOT, 'Data', 'Preprocessed Datasets', 'BRFSS_cleaned.csv')
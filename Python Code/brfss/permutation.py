@@ -0,0 +1,175 @@
+"""Permutation (Monte Carlo) chi-square tests of independence.
+
+The p-values of ``chi2_contingency`` are asymptotic, which is doubtful for
+sparse subgroup tables.  A permutation test shuffles the column labels
+against the row labels and compares the observed statistic with the
+statistics of the shuffled data.  Shuffling keeps both margins of the table,
+so only the table of each shuffle matters, and two ways of drawing it are
+offered:
+
+``'shuffle'``         permute the integer-coded column labels of a whole batch
+                      at once (``Generator.permuted``) and count every
+                      permuted table of the batch with one ``np.bincount``
+                      (a shuffle costs one random number per respondent);
+``'hypergeometric'``  draw the permuted table directly, cell by cell, from the
+                      hypergeometric distribution that shuffling induces
+                      (vectorized over the batch).  The tables have exactly
+                      the distribution of the ``'shuffle'`` tables, but a
+                      draw costs ``rows x columns`` random numbers instead of
+                      one per respondent, so 10^5 permutations of the full
+                      data take about a second.  This is the default.
+
+Batches run in worker processes with independent ``SeedSequence`` streams,
+so the result depends on the seed and batch size, not on the number of
+workers.  The p-value is ``(1 + #{T* >= T}) / (1 + permutations)``.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from brfss.bootstrap import DEFAULT_PAIRS
+from brfss.contingency import CountCube, chi2_statistic
+
+METHODS = ('hypergeometric', 'shuffle')
+
+# Shuffled labels held at once by the 'shuffle' method (8 bytes each while counting)
+SHUFFLE_ELEMENTS = 1 << 24
+
+# Relative tolerance for counting permuted statistics equal to the observed one
+TIE_TOLERANCE = 1e-9
+
+
+class PermutationResult(NamedTuple):
+    statistic: float
+    pvalue: float               # permutation p-value
+    asymptotic_pvalue: float    # chi-square distribution, as chi2_contingency
+    dof: int
+    permutations: int
+    exceedances: int            # permuted statistics >= the observed one
+
+
+def random_tables(row_totals: np.ndarray, col_totals: np.ndarray, size: int,
+                  rng: np.random.Generator) -> np.ndarray:
+    """``size`` random tables with the given margins, as shuffling the labels gives them.
+
+    Row ``i`` takes its ``row_totals[i]`` members from the labels left after
+    the earlier rows; within the row, column ``j`` gets a hypergeometric share
+    of what columns ``j`` and later still hold.
+    """
+    row_totals = np.asarray(row_totals, dtype=np.int64)
+    n_rows, n_cols = len(row_totals), len(col_totals)
+    tables = np.zeros((size, n_rows, n_cols), dtype=np.int64)
+    remaining = np.tile(np.asarray(col_totals, dtype=np.int64), (size, 1))
+    for i in range(n_rows - 1):
+        need = np.full(size, row_totals[i], dtype=np.int64)
+        later = remaining.sum(axis=1)
+        for j in range(n_cols - 1):
+            later = later - remaining[:, j]
+            tables[:, i, j] = rng.hypergeometric(remaining[:, j], later, need)
+            need -= tables[:, i, j]
+        tables[:, i, -1] = need
+        remaining -= tables[:, i]
+    tables[:, -1] = remaining
+    return tables
+
+
+def shuffled_tables(observed: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """``size`` tables of the respondents of ``observed`` with shuffled column labels."""
+    n_rows, n_cols = observed.shape
+    cells = np.arange(observed.size)
+    row_codes = np.repeat(cells // n_cols, observed.ravel())
+    col_codes = np.repeat(cells % n_cols, observed.ravel()).astype(np.int8 if n_cols < 128 else np.intp)
+
+    # One label permutation per row of a sub-batch, then one bincount over the sub-batch
+    tables = np.empty((size, n_rows, n_cols), dtype=np.int64)
+    step = max(1, SHUFFLE_ELEMENTS // max(1, len(col_codes)))
+    for start in range(0, size, step):
+        stop = min(start + step, size)
+        permuted = rng.permuted(np.broadcast_to(col_codes, (stop - start, len(col_codes))), axis=1)
+        index = np.arange(stop - start)[:, None] * observed.size + row_codes * n_cols + permuted
+        tables[start:stop] = np.bincount(index.ravel(), minlength=(stop - start) * observed.size
+                                         ).reshape(stop - start, n_rows, n_cols)
+    return tables
+
+
+def _run_batch(tables: Sequence[np.ndarray], size: int, seed: np.random.SeedSequence,
+               method: str, correction: bool) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    statistics = np.empty((size, len(tables)))
+    for k, observed in enumerate(tables):
+        if method == 'shuffle':
+            permuted = shuffled_tables(observed, size, rng)
+        else:
+            permuted = random_tables(observed.sum(axis=1), observed.sum(axis=0), size, rng)
+        statistics[:, k], _, _ = chi2_statistic(permuted, correction)
+    return statistics
+
+
+def permuted_statistics(tables: Sequence[np.ndarray], permutations: int = 10000,
+                        seed: Optional[int] = 1234, batch_size: int = 10000,
+                        method: str = 'hypergeometric', correction: bool = True,
+                        max_workers: Optional[int] = None) -> np.ndarray:
+    """Chi-square statistics of every table under ``permutations`` shuffles (permutations x tables).
+
+    ``max_workers=1`` runs the batches in this process, without a pool.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}; choose from {', '.join(METHODS)}")
+    tables = [np.asarray(table, dtype=np.int64) for table in tables]
+    sizes = [min(batch_size, permutations - start) for start in range(0, permutations, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if max_workers == 1:
+        return np.vstack([_run_batch(tables, size, batch_seed, method, correction)
+                          for size, batch_seed in zip(sizes, seeds)])
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_batch, tables, size, batch_seed, method, correction)
+                   for size, batch_seed in zip(sizes, seeds)]
+        return np.vstack([future.result() for future in futures])
+
+
+def _results(tables: Sequence[np.ndarray], permuted: np.ndarray,
+             correction: bool) -> List[PermutationResult]:
+    results = []
+    for k, observed in enumerate(tables):
+        statistic, dof, _ = chi2_statistic(observed, correction)
+        exceedances = int(np.sum(permuted[:, k] >= statistic * (1 - TIE_TOLERANCE)))
+        results.append(PermutationResult(float(statistic), (1 + exceedances) / (1 + len(permuted)),
+                                         float(stats.chi2.sf(statistic, dof)), int(dof),
+                                         len(permuted), exceedances))
+    return results
+
+
+def permutation_chi2(observed: np.ndarray, permutations: int = 10000, seed: Optional[int] = 1234,
+                     batch_size: int = 10000, method: str = 'hypergeometric',
+                     correction: bool = True, max_workers: Optional[int] = None) -> PermutationResult:
+    """Permutation chi-square test of one contingency table."""
+    observed = np.asarray(observed, dtype=np.int64)
+    permuted = permuted_statistics([observed], permutations, seed, batch_size, method,
+                                   correction, max_workers)
+    return _results([observed], permuted, correction)[0]
+
+
+def permutation_tests(cube: CountCube, pairs: Sequence[Tuple[str, str]] = DEFAULT_PAIRS,
+                      permutations: int = 10000, seed: Optional[int] = 1234,
+                      batch_size: int = 10000, method: str = 'hypergeometric',
+                      correction: bool = True, max_workers: Optional[int] = None) -> pd.DataFrame:
+    """Permutation tests of every pair of factors of ``cube``, next to the asymptotic p-values.
+
+    The tables are those of :meth:`CountCube.table` (empty levels dropped),
+    so a cube of a subgroup tests the subgroup's tables.
+    """
+    tables = [cube.table(row, column).to_numpy(dtype=np.int64) for row, column in pairs]
+    permuted = permuted_statistics(tables, permutations, seed, batch_size, method,
+                                   correction, max_workers)
+    return pd.DataFrame(
+        [(row, column, result.statistic, result.dof, result.asymptotic_pvalue, result.pvalue,
+          result.exceedances, result.permutations)
+         for (row, column), result in zip(pairs, _results(tables, permuted, correction))],
+        columns=['row', 'column', 'chi2', 'dof', 'p', 'p_permutation', 'exceedances', 'permutations'])
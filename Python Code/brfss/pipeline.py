@@ -0,0 +1,183 @@
+"""The analysis of the notebook as a sequence of stage functions.
+
+Each stage takes the output of the stage before it and returns its own
+result, so any prefix of the analysis can be run on its own:
+
+``load``       stream the XPT file (deduplicating records while reading)
+``clean``      impute, drop invalid codes and recode (``BRFSS_1``)
+``resample``   undersample the majority ``MentalHealth`` class (``BRFSS_2``)
+``chi2``       Pearson chi-square tests of the study pairs
+``anova``      Type II ANOVA of ``MentalHealth`` on the four factors
+``correlate``  correlation matrix of the one-hot encoded data
+``plot``       figures of the cleaned data and the results above
+
+Modules that pull in scipy or matplotlib are imported inside the stages
+that need them, so loading and cleaning only pay for pandas.
+:func:`build_graph` wires the stages into a :class:`StageGraph`, which runs
+the prerequisites of the requested stages and, given a cache directory,
+reuses every stage whose inputs and parameters are unchanged;
+:func:`run_stages` does both and ``python -m brfss`` exposes it on the
+command line.
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import pandas as pd
+
+from brfss.cache import StageCache, cache_key, file_fingerprint
+from brfss.dag import SourceFile, StageGraph
+from brfss.dedup import RowDeduplicator
+from brfss.filters import apply_validity_rules, rules_from_spec
+from brfss.loader import DEFAULT_CHUNK_SIZE, DESIGN_VARIABLES, LOADER_VERSION, VARIABLES_TO_KEEP, load_brfss
+from brfss.paths import IMAGES_DIR
+from brfss.profiling import Profiler
+from brfss.recode import RECODE_SPEC, recode
+from brfss.resample import resample
+
+FACTORS = ['Veteran', 'GeneralHealth', 'Education', 'Age_Group']
+RESPONSE = 'MentalHealth'
+IMPUTED = ['VETERAN3', 'GENHLTH', 'EDUCA']
+
+STAGES = ['load', 'clean', 'resample', 'chi2', 'anova', 'correlate', 'plot']
+
+
+def load(file_path: str, chunksize: int = DEFAULT_CHUNK_SIZE, dedup: bool = True,
+         cache: Optional[StageCache] = None, engine: str = 'native') -> pd.DataFrame:
+    """Study and design variables of ``file_path``, duplicates removed while streaming."""
+    columns = VARIABLES_TO_KEEP + DESIGN_VARIABLES
+
+    def compute() -> pd.DataFrame:
+        return load_brfss(file_path, columns=columns, chunksize=chunksize,
+                          dedup=RowDeduplicator() if dedup else None, engine=engine)
+
+    if cache is None:
+        return compute()
+    key = cache_key(file_fingerprint(file_path), LOADER_VERSION, columns=columns, dedup=dedup,
+                    engine=engine)
+    return cache.get_or_compute('raw', key, compute)
+
+
+def clean(raw: pd.DataFrame, spec: Mapping[str, Mapping] = RECODE_SPEC,
+          medians: Optional[Mapping[str, float]] = None) -> pd.DataFrame:
+    """Median-impute, apply the validity rules and recode (the notebook's ``BRFSS_1``).
+
+    The validity rules follow ``spec``, so changed ``Age_Group`` bins also
+    change the accepted age range.  ``medians`` of the imputed columns are
+    computed from ``raw`` unless given (the out-of-core path cleans chunk by
+    chunk with the medians of the whole file).
+    """
+    frame = raw.loc[:, [column for column in VARIABLES_TO_KEEP + DESIGN_VARIABLES
+                        if column in raw.columns]]
+    if medians is None:
+        medians = {column: frame[column].median() for column in IMPUTED}
+    frame = frame.fillna(dict(medians))
+    frame, _ = apply_validity_rules(frame, rules_from_spec(spec))
+    return recode(frame, spec).drop(columns=['EDUCA'])
+
+
+def balance(cleaned: pd.DataFrame, method: str = 'under', seed: Optional[int] = 1234) -> pd.DataFrame:
+    """Balanced ``MentalHealth`` classes with the recoded columns only (``BRFSS_2``)."""
+    return resample(cleaned, RESPONSE, FACTORS + [RESPONSE], method=method, seed=seed)
+
+
+def chi_square(resampled: pd.DataFrame,
+               pairs: Optional[Sequence[Sequence[str]]] = None) -> pd.DataFrame:
+    """Chi-square statistic, p-value and dof of every study pair."""
+    from brfss.bootstrap import DEFAULT_PAIRS
+    from brfss.contingency import CountCube, chi2_summary, chi2_tests
+
+    cube = CountCube.from_frame(resampled, [RESPONSE] + FACTORS)
+    return chi2_summary(chi2_tests(cube, pairs or DEFAULT_PAIRS))
+
+
+def anova(resampled: pd.DataFrame) -> pd.DataFrame:
+    """Type II ANOVA table of ``MentalHealth`` on the four factors."""
+    from brfss.anova import anova_type2
+
+    return anova_type2(resampled, RESPONSE, FACTORS)
+
+
+def correlate(resampled: pd.DataFrame) -> pd.DataFrame:
+    """Correlation matrix of the one-hot encoded resampled data."""
+    from brfss.correlation import Correlation
+    from brfss.encoding import one_hot_encode
+
+    return Correlation.from_data(one_hot_encode(resampled, FACTORS)).matrix
+
+
+def plot(cleaned: pd.DataFrame, resampled: pd.DataFrame, anova_table: pd.DataFrame,
+         correlation_matrix: pd.DataFrame, directory: str = IMAGES_DIR,
+         max_workers: Optional[int] = None) -> List[Dict[str, str]]:
+    """Render the report figures; returns the manifest."""
+    from brfss.figures import bar, count_bar, heatmap, histogram, render_figures, trend
+    from brfss.trend import age_trend
+
+    figures = [histogram(cleaned[column]) for column in FACTORS]
+    figures.append(count_bar(cleaned[RESPONSE], 'BRFSS Mental Health', 'BRFSS Mental Health',
+                             xlabel='Mental Health Status', rotation=45))
+    figures.append(count_bar(resampled[RESPONSE], 'Mental Health Distribution After Resampling',
+                             'Mental Health Distribution After Resampling',
+                             xlabel='Mental Health Status'))
+    effects = anova_table.drop(index='Residual')
+    figures.append(bar('ANOVA Results (F-value)', effects.index, effects['F'], 'ANOVA Results',
+                       xlabel='Variable', ylabel='F-value', rotation=45))
+    figures.append(bar('ANOVA Results (p-value)', effects.index, effects['PR(>F)'], 'ANOVA Results',
+                       xlabel='Variable', ylabel='p-value', rotation=45))
+    figures.append(heatmap('Correlation Matrix', correlation_matrix, 'Correlation Matrix'))
+    figures.append(trend('Frequent Mental Distress by Age', age_trend(cleaned),
+                         'Frequent Mental Distress (14+ days) by Age'))
+    return render_figures(figures, directory, max_workers=max_workers)
+
+
+def _plot_stage(cleaned: pd.DataFrame, resampled: pd.DataFrame, anova_table: pd.DataFrame,
+                correlation_matrix: pd.DataFrame, directory: str,
+                max_workers: Optional[int]) -> pd.DataFrame:
+    return pd.DataFrame(plot(cleaned, resampled, anova_table, correlation_matrix,
+                             directory, max_workers))
+
+
+def build_graph(file_path: str, cache_dir: Optional[str] = None,
+                chunksize: int = DEFAULT_CHUNK_SIZE, dedup: bool = True,
+                spec: Mapping[str, Mapping] = RECODE_SPEC, method: str = 'under',
+                seed: Optional[int] = 1234, figures_dir: str = IMAGES_DIR,
+                max_workers: Optional[int] = None,
+                profiler: Optional[Profiler] = None, engine: str = 'native') -> StageGraph:
+    """The analysis as a stage graph, memoized in ``cache_dir`` when given.
+
+    Change a parameter later with ``graph.set_params('clean', spec=...)`` and
+    run again: only that stage and the stages after it are recomputed.
+    """
+    graph = StageGraph(StageCache(cache_dir) if cache_dir else None, profiler)
+    # The chunk size does not change the result, so it stays out of the key; the engines
+    # decode zero differently (see brfss.xport), so the engine is part of it
+    graph.add('load', partial(load, chunksize=chunksize),
+              params={'file_path': SourceFile(file_path), 'dedup': dedup, 'engine': engine},
+              version=LOADER_VERSION)
+    graph.add('clean', clean, ['load'], {'spec': spec})
+    graph.add('resample', balance, ['clean'], {'method': method, 'seed': seed})
+    graph.add('chi2', chi_square, ['resample'])
+    graph.add('anova', anova, ['resample'])
+    graph.add('correlate', correlate, ['resample'])
+    # Always rendered: the figures on disk are the output
+    graph.add('plot', _plot_stage, ['clean', 'resample', 'anova', 'correlate'],
+              {'directory': figures_dir, 'max_workers': max_workers}, cache=False)
+    return graph
+
+
+def run_stages(file_path: str, stages: Iterable[str], chunksize: int = DEFAULT_CHUNK_SIZE,
+               dedup: bool = True, seed: Optional[int] = 1234, cache_dir: Optional[str] = None,
+               figures_dir: str = IMAGES_DIR,
+               max_workers: Optional[int] = None,
+               profiler: Optional[Profiler] = None, engine: str = 'native') -> Dict[str, Any]:
+    """Run the requested stages (and, unless cached, their prerequisites)."""
+    stages = list(stages)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage {unknown[0]!r}; choose from {', '.join(STAGES)}")
+    graph = build_graph(file_path, cache_dir, chunksize, dedup, seed=seed,
+                        figures_dir=figures_dir, max_workers=max_workers, profiler=profiler,
+                        engine=engine)
+    return graph.run(*stages)
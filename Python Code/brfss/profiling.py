@@ -0,0 +1,178 @@
+"""Per-stage timing and memory instrumentation.
+
+:class:`Profiler` measures each stage it runs: wall and CPU time, the peak
+of Python allocations during the stage (``tracemalloc``), the process RSS
+after it and its high-water mark (``getrusage``), and the shape of the
+frames going in and coming out.  The records are written as JSON (for
+comparing runs and catching regressions) and as a markdown table next to
+``Results/Summary Statistics.md``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from brfss.paths import RESULTS_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_NAME = 'Profiling Report'
+
+_MB = 1 << 20
+
+
+def _shape(value: Any) -> Optional[Tuple[int, int]]:
+    shape = getattr(value, 'shape', None)
+    if shape is None or len(shape) != 2:
+        return None
+    return int(shape[0]), int(shape[1])
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of the resident set size of this process."""
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / _MB if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size (Linux only, NaN elsewhere)."""
+    try:
+        with open('/proc/self/statm') as handle:
+            pages = int(handle.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return float('nan')
+    return pages * os.sysconf('SC_PAGE_SIZE') / _MB
+
+
+class StageRecord:
+    """Measurements of one stage; filled in by :meth:`Profiler.stage`."""
+
+    def __init__(self, stage: str, inputs: Sequence[Any] = ()) -> None:
+        self.stage = stage
+        self.inputs = [_shape(value) for value in inputs]
+        self.output: Optional[Tuple[int, int]] = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_traced_mb = float('nan')
+        self.rss_mb = float('nan')
+        self.peak_rss_mb = float('nan')
+
+    def set_output(self, value: Any) -> None:
+        self.output = _shape(value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stage': self.stage,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'peak_traced_mb': _finite(self.peak_traced_mb),
+            'rss_mb': _finite(self.rss_mb),
+            'peak_rss_mb': _finite(self.peak_rss_mb),
+            'rows_in': sum(shape[0] for shape in self.inputs if shape),
+            'columns_in': sum(shape[1] for shape in self.inputs if shape),
+            'rows_out': self.output[0] if self.output else None,
+            'columns_out': self.output[1] if self.output else None,
+        }
+
+
+class Profiler:
+    """Collects a :class:`StageRecord` per measured stage.
+
+    ``trace_memory`` enables ``tracemalloc``, which slows allocation-heavy
+    code (and imports) down noticeably; the RSS figures are always recorded.
+    Worker processes forked during a traced stage inherit the tracing, so
+    time stages with process pools (``plot``) with ``trace_memory=False``.
+    """
+
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.trace_memory = trace_memory
+        self.records: List[StageRecord] = []
+
+    @contextmanager
+    def stage(self, name: str, inputs: Sequence[Any] = ()) -> Iterator[StageRecord]:
+        """Measure the ``with`` block; call ``record.set_output`` with its result."""
+        record = StageRecord(name, inputs)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = time.perf_counter() - wall
+            record.cpu_seconds = time.process_time() - cpu
+            if self.trace_memory:
+                record.peak_traced_mb = tracemalloc.get_traced_memory()[1] / _MB
+            if started_tracing:
+                tracemalloc.stop()
+            record.rss_mb = current_rss_mb()
+            record.peak_rss_mb = peak_rss_mb()
+            self.records.append(record)
+
+    def measure(self, name: str, func: Callable[..., Any], *inputs: Any, **params: Any) -> Any:
+        """Call ``func(*inputs, **params)`` as stage ``name`` and return its result."""
+        with self.stage(name, inputs) as record:
+            result = func(*inputs, **params)
+            record.set_output(result)
+        return result
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame([record.as_dict() for record in self.records])
+
+    def to_markdown(self) -> str:
+        table = self.table()
+        lines = [f"# {REPORT_NAME}", '',
+                 '| Stage | Wall (s) | CPU (s) | Peak traced (MB) | RSS (MB) | Peak RSS (MB) '
+                 '| Rows in | Columns in | Rows out | Columns out |',
+                 '|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|']
+        for row in table.itertuples(index=False):
+            lines.append(
+                f"| {row.stage} | {row.wall_seconds:.3f} | {row.cpu_seconds:.3f} "
+                f"| {_megabytes(row.peak_traced_mb)} | {_megabytes(row.rss_mb)} "
+                f"| {_megabytes(row.peak_rss_mb)} "
+                f"| {row.rows_in} | {row.columns_in} | {_count(row.rows_out)} | {_count(row.columns_out)} |")
+        if len(table):
+            lines += ['', f"**Total:** {table['wall_seconds'].sum():.3f} s wall, "
+                          f"{table['cpu_seconds'].sum():.3f} s CPU, "
+                          f"peak RSS {table['peak_rss_mb'].max():.1f} MB"]
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, directory: str = RESULTS_DIR, name: str = REPORT_NAME) -> Tuple[str, str]:
+        """Write ``<name>.json`` and ``<name>.md`` to ``directory``; returns both paths."""
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"{name}.json")
+        markdown_path = os.path.join(directory, f"{name}.md")
+        with open(json_path, 'w') as handle:
+            json.dump([record.as_dict() for record in self.records], handle, indent=2)
+        with open(markdown_path, 'w') as handle:
+            handle.write(self.to_markdown())
+        return json_path, markdown_path
+
+
+def _finite(value: float) -> Optional[float]:
+    # NaN is not valid JSON; unavailable measurements are written as null
+    return None if value != value else value
+
+
+def _megabytes(value: Optional[float]) -> str:
+    return '' if pd.isna(value) else f"{value:.1f}"
+
+
+def _count(value: Any) -> str:
+    return '' if value is None or pd.isna(value) else str(int(value))
@@ -0,0 +1,115 @@
+"""Declarative recoding of the BRFSS code columns.
+
+``RECODE_SPEC`` lists, for every analysis variable, the raw BRFSS column it
+comes from and either a code -> label map or the bin edges for a numeric
+column.  :func:`recode` compiles each entry into a lookup array (or a
+``searchsorted`` over the bin edges) and builds all the new columns in a
+single vectorized pass, without row-wise ``apply`` or per-label ``loc``
+assignments.  Label columns come out as ``Categorical`` with fixed,
+alphabetically ordered categories, which is also the column order
+``pd.get_dummies`` produced for the original object columns.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+RECODE_SPEC: Dict[str, Dict[str, Any]] = {
+    # 1= Yes, 2= No (7= Don't know, 9= Refused are not valid answers)
+    'Veteran': {
+        'source': 'VETERAN3',
+        'labels': {1: 'Yes', 2: 'No'},
+    },
+    # Keep Excellent, Good and Poor only
+    'GeneralHealth': {
+        'source': 'GENHLTH',
+        'labels': {1: 'Excellent', 3: 'Good', 5: 'Poor'},
+    },
+    # Grades 1-8, grades 9-12/GED, and any college
+    'Education': {
+        'source': 'EDUCA',
+        'labels': {2: 'Elementary', 3: 'High_School', 4: 'High_School',
+                   5: 'College', 6: 'College'},
+    },
+    # Ages 18-34, 35-54 and 55 and up
+    'Age_Group': {
+        'source': '_AGE80',
+        'bins': [18, 35, 55, np.inf],
+        'labels': ['18_to_34', '35_to_54', '55'],
+    },
+    # 0 = 0-13 days, 1 = 14+ days when mental health was not good
+    'MentalHealth': {
+        'source': '_MENT14D',
+        'labels': {1: 0, 2: 0, 3: 1},
+    },
+}
+
+
+def valid_codes(entry: Mapping[str, Any]) -> Optional[np.ndarray]:
+    """Raw codes accepted by a ``labels`` entry (``None`` for binned entries)."""
+    if 'bins' in entry:
+        return None
+    return np.array(sorted(entry['labels']), dtype=np.float64)
+
+
+def label_categories(entry: Mapping[str, Any]) -> list:
+    """Sorted labels of an entry: the categories (or values) of its recoded column."""
+    labels = entry['labels']
+    values = labels if 'bins' in entry else labels.values()
+    return sorted(set(values))
+
+
+def category_codes(entry: Mapping[str, Any], values: np.ndarray) -> np.ndarray:
+    """Map raw values to positions in the entry's categories (-1 if invalid)."""
+    values = np.asarray(values, dtype=np.float64)
+    categories = label_categories(entry)
+    codes = np.full(len(values), -1, dtype=np.int8)
+
+    if 'bins' in entry:
+        edges = np.asarray(entry['bins'], dtype=np.float64)
+        # Bins are closed on the left, open on the right: [18, 35), [35, 55), [55, inf)
+        bin_index = np.searchsorted(edges, values, side='right') - 1
+        valid = (bin_index >= 0) & (bin_index < len(edges) - 1)
+        lookup = np.array([categories.index(label) for label in entry['labels']],
+                          dtype=np.int8)
+        codes[valid] = lookup[bin_index[valid]]
+        return codes
+
+    labels = entry['labels']
+    lookup = np.full(int(max(labels)) + 1, -1, dtype=np.int8)
+    for code, label in labels.items():
+        lookup[int(code)] = categories.index(label)
+
+    valid = np.isfinite(values) & (values >= 0) & (values < len(lookup))
+    valid[valid] = values[valid] == np.floor(values[valid])
+    codes[valid] = lookup[values[valid].astype(np.intp)]
+    return codes
+
+
+def recode(frame: pd.DataFrame,
+           spec: Mapping[str, Mapping[str, Any]] = RECODE_SPEC) -> pd.DataFrame:
+    """Return ``frame`` with one recoded column added per entry of ``spec``.
+
+    Text labels become ``Categorical`` columns (invalid codes are NaN).
+    Numeric labels, such as ``MentalHealth``, become ``int8`` columns and
+    therefore require the invalid codes to be filtered out beforehand.
+    """
+    new_columns = {}
+    for name, entry in spec.items():
+        categories = label_categories(entry)
+        codes = category_codes(entry, frame[entry['source']].to_numpy())
+
+        if all(isinstance(label, str) for label in categories):
+            new_columns[name] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            if (codes < 0).any():
+                raise ValueError(
+                    f"{entry['source']} has codes outside {sorted(entry['labels'])}; "
+                    f"filter invalid rows before recoding '{name}'")
+            new_columns[name] = np.asarray(categories, dtype=np.int8)[codes]
+
+    return frame.assign(**{name: pd.Series(values, index=frame.index)
+                           for name, values in new_columns.items()})
@@ -0,0 +1,75 @@
+"""Class balancing by drawing row positions, not by copying frames.
+
+:func:`resample_indices` works on the label column (and optional extra
+stratification keys) only: rows are grouped by their integer-coded
+(stratum, class) and each group is sampled with ``numpy.random.Generator``.
+The returned positions are applied once, to just the columns that are kept,
+with :func:`resample`.  ``method='under'`` reduces every class to the size of
+the smallest class in its stratum (``RandomUnderSampler``'s default
+strategy); ``method='over'`` tops every class up to the largest one by
+drawing extra rows with replacement (``RandomOverSampler``).
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from brfss.contingency import encode
+
+SeedLike = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+
+def resample_indices(labels: pd.Series, strata: Optional[Sequence[pd.Series]] = None,
+                     method: str = 'under', seed: SeedLike = None) -> np.ndarray:
+    """Sorted positions of the rows kept (or repeated) to balance ``labels``."""
+    if method not in ('under', 'over'):
+        raise ValueError(f"method must be 'under' or 'over', not {method!r}")
+    rng = np.random.default_rng(seed)
+
+    label_codes, label_levels = encode(labels)
+    n_labels = len(label_levels)
+    observed = label_codes >= 0
+    stratum_codes = np.zeros(len(labels), dtype=np.intp)
+    n_strata = 1
+    for key in strata or []:
+        codes, levels = encode(key)
+        observed &= codes >= 0
+        stratum_codes = stratum_codes * len(levels) + codes
+        n_strata *= len(levels)
+
+    group = stratum_codes * n_labels + label_codes
+    group[~observed] = -1
+    counts = np.bincount(group[observed], minlength=n_strata * n_labels).reshape(n_strata, n_labels)
+
+    # Positions of the rows of each group, grouped by a single stable sort
+    order = np.argsort(group, kind='stable')
+    bounds = np.cumsum(np.bincount(group + 1, minlength=n_strata * n_labels + 1))
+
+    selected = []
+    for stratum in range(n_strata):
+        present = counts[stratum] > 0
+        if not present.any():
+            continue
+        target = counts[stratum][present].min() if method == 'under' else counts[stratum].max()
+        for label in np.flatnonzero(present):
+            g = stratum * n_labels + label
+            members = order[bounds[g]:bounds[g + 1]]
+            if method == 'under':
+                selected.append(rng.choice(members, target, replace=False))
+            else:
+                selected.append(members)
+                selected.append(rng.choice(members, target - len(members), replace=True))
+    return np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype=np.intp)
+
+
+def resample(frame: pd.DataFrame, target: str, columns: Optional[Sequence[str]] = None,
+             strata: Optional[Sequence[str]] = None, method: str = 'under',
+             seed: SeedLike = None) -> pd.DataFrame:
+    """Balance ``target`` and return only ``columns`` of the selected rows."""
+    positions = resample_indices(frame[target],
+                                 [frame[key] for key in strata or []], method, seed)
+    columns = list(frame.columns if columns is None else columns)
+    return frame.iloc[positions, [frame.columns.get_loc(column) for column in columns]]
@@ -0,0 +1,272 @@
+"""Local HTTP service answering dashboard queries from the joint count cube.
+
+Every slice the dashboard shows is a function of the joint counts of
+``Veteran x GeneralHealth x Education x Age_Group x MentalHealth`` (108
+cells).  The service loads that cube once at startup, from a saved ``.npz``
+or by counting ``BRFSS_cleaned.csv``, and answers every query by summing
+and indexing the cube, so the cost of a query does not depend on the number
+of respondents.  Answers are kept in an LRU cache keyed by the normalized
+query, so repeated clicks are a dictionary lookup.
+
+Endpoints (``GET``, JSON responses); any factor name used as a query
+parameter filters the cube to the given comma-separated levels first:
+
+``/meta``                         factors, their levels and the total count
+``/slice?by=A,B``                 counts over ``by``, summing out the rest
+``/rollup?by=A``                  respondents and mean ``MentalHealth`` per group
+``/chi2?row=A&column=B``          Pearson chi-square test of the filtered table
+``/cache``                        LRU cache statistics
+
+Run with ``python -m brfss.server --port 8050``; ``--save-cube`` writes the
+cube as ``.npz`` for later starts with ``--cube``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import sys
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from brfss.contingency import CountCube, chi2_statistic
+from brfss.paths import CLEANED_CSV
+from brfss.synthetic import fit_cube
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+DEFAULT_CACHE_SIZE = 4096
+RESPONSE = 'MentalHealth'
+
+Query = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class QueryError(ValueError):
+    """A query the cube cannot answer; reported as HTTP 400."""
+
+
+def save_cube(cube: CountCube, path: str) -> str:
+    levels = [[getattr(level, 'item', lambda: level)() for level in factor_levels]
+              for factor_levels in cube.levels]
+    with open(path, 'wb') as handle:
+        np.savez(handle, counts=cube.counts,
+                 layout=json.dumps({'factors': cube.factors, 'levels': levels}))
+    return path
+
+
+def load_cube(path: str) -> CountCube:
+    with np.load(path) as data:
+        layout = json.loads(str(data['layout']))
+        return CountCube(layout['factors'], layout['levels'], data['counts'])
+
+
+class CubeService:
+    """Answers queries on ``cube``; ``answer`` is memoized per normalized query."""
+
+    def __init__(self, cube: CountCube, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.cube = cube
+        self.levels = {factor: [str(level) for level in levels]
+                       for factor, levels in zip(cube.factors, cube.levels)}
+        self.handlers = {'/meta': self.meta, '/slice': self.slice, '/rollup': self.rollup,
+                         '/chi2': self.chi2}
+        self.answer = lru_cache(maxsize=cache_size)(self._answer)
+
+    @staticmethod
+    def normalize(target: str) -> Query:
+        """``(path, sorted parameters)`` of a request target: the cache key."""
+        parts = urlsplit(target)
+        return parts.path.rstrip('/') or '/', tuple(sorted(parse_qsl(parts.query)))
+
+    def _names(self, value: str, parameter: str) -> List[str]:
+        names = [name for name in value.split(',') if name]
+        unknown = [name for name in names if name not in self.levels]
+        if unknown:
+            raise QueryError(f"Unknown factor(s) in {parameter}: {unknown}; "
+                             f"choose from {self.cube.factors}")
+        if len(set(names)) < len(names):
+            raise QueryError(f"Repeated factor(s) in {parameter}: {names}")
+        return names
+
+    def _filtered(self, params: Mapping[str, str]) -> CountCube:
+        # Restrict every filtered axis to the requested levels
+        index: List[Any] = [slice(None)] * len(self.cube.factors)
+        levels = list(self.cube.levels)
+        for factor, value in params.items():
+            if factor not in self.levels:
+                continue
+            wanted = list(dict.fromkeys(value.split(',')))
+            unknown = [level for level in wanted if level not in self.levels[factor]]
+            if unknown:
+                raise QueryError(f"Unknown level(s) of {factor}: {unknown}; "
+                                 f"choose from {self.levels[factor]}")
+            axis = self.cube.factors.index(factor)
+            positions = [self.levels[factor].index(level) for level in wanted]
+            index[axis] = positions
+            levels[axis] = [self.cube.levels[axis][position] for position in positions]
+        counts = self.cube.counts
+        for axis, selection in enumerate(index):
+            if not isinstance(selection, slice):
+                counts = np.take(counts, selection, axis=axis)
+        return CountCube(self.cube.factors, levels, counts)
+
+    def _answer(self, query: Query) -> bytes:
+        path, pairs = query
+        names = [name for name, _ in pairs]
+        repeated = sorted({name for name in names if names.count(name) > 1})
+        if repeated:
+            raise QueryError(f"Repeated parameter(s) {repeated}; give several values "
+                             f"comma-separated, e.g. Veteran=Yes,No")
+        return json.dumps(self.handlers[path](dict(pairs))).encode()
+
+    def meta(self, params: Mapping[str, str]) -> Dict[str, Any]:
+        return {'factors': self.cube.factors, 'levels': self.levels, 'total': self.cube.total}
+
+    def slice(self, params: Mapping[str, str]) -> Dict[str, Any]:
+        by = self._names(params.get('by', ''), 'by')
+        cube = self._filtered(params)
+        counts = cube.marginal(*by) if by else np.asarray(cube.total)
+        return {'by': by, 'levels': {factor: _labels(cube, factor) for factor in by},
+                'counts': counts.tolist(), 'total': cube.total}
+
+    def rollup(self, params: Mapping[str, str]) -> Dict[str, Any]:
+        by = self._names(params.get('by', ''), 'by')
+        if RESPONSE in by:
+            raise QueryError(f"{RESPONSE} is the response; roll up over the other factors")
+        cube = self._filtered(params)
+        values = np.asarray(cube.levels[cube.factors.index(RESPONSE)], dtype=np.float64)
+        counts = cube.marginal(*by, RESPONSE)
+        n = counts.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = (counts * values).sum(axis=-1) / n
+        return {'by': by, 'levels': {factor: _labels(cube, factor) for factor in by},
+                'n': n.tolist(), 'mean': _finite(mean), 'total': cube.total}
+
+    def chi2(self, params: Mapping[str, str]) -> Dict[str, Any]:
+        row = self._names(params.get('row', ''), 'row')
+        column = self._names(params.get('column', ''), 'column')
+        if len(row) != 1 or len(column) != 1 or row == column:
+            raise QueryError("chi2 needs two different factors as row= and column=")
+        cube = self._filtered(params)
+        if not cube.total:
+            raise QueryError("No respondents match the filters")
+        # chi2_tests on a single table, without its DataFrame round trip
+        from scipy.special import chdtrc
+
+        observed = cube.marginal(row[0], column[0])
+        statistic, dof, _ = chi2_statistic(observed)
+        return {'row': row[0], 'column': column[0], 'chi2': _finite(statistic),
+                'p': _finite(chdtrc(dof, statistic)), 'dof': int(dof), 'n': cube.total}
+
+    def respond(self, target: str) -> Tuple[int, bytes]:
+        """HTTP status and JSON body for a request target such as ``/slice?by=Veteran``."""
+        query = self.normalize(target)
+        if query[0] == '/cache':
+            return 200, json.dumps(self.answer.cache_info()._asdict()).encode()
+        if query[0] not in self.handlers:
+            return 404, json.dumps({'error': f"Unknown endpoint {query[0]}"}).encode()
+        try:
+            return 200, self.answer(query)
+        except QueryError as error:
+            return 400, json.dumps({'error': str(error)}).encode()
+
+
+def _labels(cube: CountCube, factor: str) -> List[str]:
+    return [str(level) for level in cube.levels[cube.factors.index(factor)]]
+
+
+def _finite(value: Any) -> Any:
+    # NaN (e.g. the mean of an empty group) is not valid JSON
+    if np.ndim(value):
+        return [_finite(item) for item in np.asarray(value).tolist()]
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+async def _handle(service: CubeService, reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter) -> None:
+    # Minimal HTTP/1.1: GET only, keep-alive unless the client closes
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+            # A body is not used, but must not be read as the next request
+            await reader.readexactly(int(headers.get('content-length') or 0))
+
+            method, target, version = (request_line.decode('latin-1').split() + ['', '', ''])[:3]
+            if method == 'GET':
+                try:
+                    status, body = service.respond(target)
+                except Exception as error:
+                    # A bug in a handler still gets an answer, and the connection stays usable
+                    status, body = 500, json.dumps({'error': f"{type(error).__name__}: {error}"}).encode()
+            else:
+                status, body = 405, json.dumps({'error': "Only GET is supported"}).encode()
+            close = (headers.get('connection') == 'close'
+                     or (version == 'HTTP/1.0' and headers.get('connection') != 'keep-alive'))
+            writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n"
+                         f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + body)
+            await writer.drain()
+            if close:
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service: CubeService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    server = await asyncio.start_server(lambda reader, writer: _handle(service, reader, writer),
+                                        host, port)
+    async with server:
+        print(f"[server] serving {service.cube.total} respondents on http://{host}:{port}")
+        await server.serve_forever()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m brfss.server',
+                                     description="Serve dashboard queries from the joint count cube.")
+    parser.add_argument('--cube', help="saved .npz cube (default: count --csv at startup)")
+    parser.add_argument('--csv', default=CLEANED_CSV, help="cleaned data to count (default: BRFSS_cleaned.csv)")
+    parser.add_argument('--save-cube', metavar='PATH', help="write the cube as .npz and exit")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help="answers kept in the LRU cache (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    cube = load_cube(args.cube) if args.cube else fit_cube(args.csv)
+    if args.save_cube:
+        print(f"[server] cube written to {save_cube(cube, args.save_cube)}")
+        return 0
+    service = CubeService(cube, args.cache_size)
+    # Import scipy now rather than on the first chi2 query
+    importlib.import_module('scipy.special')
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""One-pass summary statistics and z-score outlier flagging over chunks.
+
+:class:`StreamingStats` folds chunks into per-column running moments (Welford
+/ Chan et al. merge), min/max and exact value counts.  The BRFSS code columns
+only take a handful of distinct values, so the counts give the exact mode and
+quantiles without keeping the data around.  :func:`zscore_outliers` is the
+second pass: it reuses the accumulated mean and standard deviation and
+returns only the index labels of outlier rows, never a full z-score matrix.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Columns with more distinct values than this stop tracking exact counts
+MAX_DISTINCT = 1000
+
+
+class _ColumnStats:
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.counts: Optional[Dict[float, int]] = {}
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        n_b = len(values)
+        if not n_b:
+            return
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+
+        # Merge the chunk moments into the running moments
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        if self.counts is not None:
+            uniques, counts = np.unique(values, return_counts=True)
+            for value, count in zip(uniques.tolist(), counts.tolist()):
+                self.counts[value] = self.counts.get(value, 0) + count
+            if len(self.counts) > MAX_DISTINCT:
+                self.counts = None
+
+    def std(self) -> float:
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation between order statistics, as pandas does
+        if not self.counts:
+            return np.nan
+        values = np.array(sorted(self.counts))
+        cumulative = np.cumsum([self.counts[value] for value in values])
+        position = (self.count - 1) * q
+        lower = values[np.searchsorted(cumulative, np.floor(position), side='right')]
+        upper = values[np.searchsorted(cumulative, np.ceil(position), side='right')]
+        return lower + (upper - lower) * (position - np.floor(position))
+
+    def mode(self) -> float:
+        if not self.counts:
+            return np.nan
+        # Smallest of the most frequent values, like DataFrame.mode().iloc[0]
+        top = max(self.counts.values())
+        return min(value for value, count in self.counts.items() if count == top)
+
+
+class StreamingStats:
+    """Accumulate count, mean, std, min/max, quantiles and mode over chunks."""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None) -> None:
+        self.columns: Optional[List[str]] = None if columns is None else list(columns)
+        self._stats: Dict[str, _ColumnStats] = {}
+
+    def update(self, chunk: pd.DataFrame) -> 'StreamingStats':
+        if self.columns is None:
+            self.columns = list(chunk.select_dtypes(include='number').columns)
+        for column in self.columns:
+            stats = self._stats.setdefault(column, _ColumnStats())
+            stats.update(chunk[column].to_numpy(dtype=np.float64))
+        return self
+
+    def update_all(self, chunks: Iterable[pd.DataFrame]) -> 'StreamingStats':
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def mean(self) -> pd.Series:
+        return pd.Series({column: stats.mean for column, stats in self._stats.items()})
+
+    def std(self) -> pd.Series:
+        return pd.Series({column: stats.std() for column, stats in self._stats.items()})
+
+    def quantile(self, q: float) -> pd.Series:
+        return pd.Series({column: stats.quantile(q) for column, stats in self._stats.items()})
+
+    def describe(self, percentiles: Sequence[float] = (.25, .50, .75)) -> pd.DataFrame:
+        """Transposed ``DataFrame.describe`` with an extra ``mode`` column."""
+        rows = {}
+        for column, stats in self._stats.items():
+            row = {'count': float(stats.count), 'mean': stats.mean,
+                   'std': stats.std(), 'min': stats.min}
+            for q in percentiles:
+                row[f"{q * 100:g}%"] = stats.quantile(q)
+            row['max'] = stats.max
+            row['mode'] = stats.mode()
+            rows[column] = row
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def iter_frame_chunks(frame: pd.DataFrame, chunksize: int = 10000) -> Iterator[pd.DataFrame]:
+    """Yield row slices of an in-memory frame (views, not copies)."""
+    for start in range(0, len(frame), chunksize):
+        yield frame.iloc[start:start + chunksize]
+
+
+def zscore_outliers(chunks: Iterable[pd.DataFrame], stats: StreamingStats,
+                    threshold: float = 3) -> pd.Index:
+    """Index labels of rows with any ``|z| > threshold``.
+
+    Second pass over the same data ``stats`` was accumulated from; z-scores
+    are evaluated one column at a time so no float copy of a chunk is made.
+    """
+    mean = stats.mean()
+    std = stats.std()
+    labels = []
+    for chunk in chunks:
+        flagged = np.zeros(len(chunk), dtype=bool)
+        for column in mean.index:
+            values = chunk[column].to_numpy(dtype=np.float64)
+            flagged |= np.abs(values - mean[column]) > threshold * std[column]
+        labels.append(chunk.index[flagged])
+    if not labels:
+        return pd.Index([])
+    return labels[0].append(labels[1:])
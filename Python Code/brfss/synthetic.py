@@ -0,0 +1,144 @@
+"""Synthetic BRFSS-shaped records for benchmarks at 10^5 - 10^8 rows.
+
+The generator is fitted on the joint distribution of the five study
+variables in ``Data/Preprocessed Datasets/BRFSS_cleaned.csv``: one
+:class:`CountCube` over ``Veteran x GeneralHealth x Education x Age_Group x
+MentalHealth``.  Sampling draws a cell per record from the cube's
+proportions and maps each label back to a raw code through ``RECODE_SPEC``
+(uniformly among the codes of a label, e.g. ``EDUCA`` 3 or 4 for
+``High_School``, and a uniform age inside the ``Age_Group`` bin).  A
+fraction of every column is then replaced by codes the study drops
+(don't know / refused / missing, the other ``GENHLTH`` answers), and the
+design variables are filled in, so the output looks like the loader's and
+exercises every cleaning rule.
+
+Records are produced in chunks with independent ``SeedSequence`` streams, so
+a given ``(n_rows, seed, chunksize)`` always yields the same data and 10^8
+rows never need more than one chunk of temporaries.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from brfss.contingency import CountCube
+from brfss.loader import VARIABLES_TO_KEEP, downcast
+from brfss.paths import CLEANED_CSV
+from brfss.recode import RECODE_SPEC
+
+# _AGE80 is top-coded at 80
+AGE_MAX = 80
+
+# Raw codes outside the study categories (2018 codebook); NaN is a blank answer
+OTHER_CODES: Dict[str, List[float]] = {
+    'VETERAN3': [7, 9, np.nan],
+    'GENHLTH': [2, 4, 7, 9, np.nan],
+    'EDUCA': [1, 9, np.nan],
+    '_MENT14D': [9],
+}
+
+# Respondents per stratum, roughly as in the 2018 file
+STRATUM_SIZE = 200
+
+
+def fit_cube(path: str = CLEANED_CSV, spec: Mapping[str, Mapping[str, Any]] = RECODE_SPEC) -> CountCube:
+    """Joint counts of the recoded study variables in the cleaned CSV."""
+    frame = pd.read_csv(path, dtype={name: str for name, entry in spec.items()
+                                     if 'bins' in entry})
+    return CountCube.from_frame(frame, list(spec))
+
+
+class SyntheticBRFSS:
+    """Sampler of raw BRFSS records whose recoded joint distribution is ``cube``.
+
+    ``other_rate`` is the share of each code column replaced by codes the
+    study filters out; ``design`` adds ``_LLCPWT``, ``_STSTR`` and ``_PSU``.
+    """
+
+    def __init__(self, cube: Optional[CountCube] = None,
+                 spec: Mapping[str, Mapping[str, Any]] = RECODE_SPEC,
+                 other_rate: float = 0.1, design: bool = True) -> None:
+        self.cube = fit_cube(spec=spec) if cube is None else cube
+        self.spec = spec
+        self.other_rate = other_rate
+        self.design = design
+        self.probabilities = self.cube.counts.ravel() / self.cube.total
+
+    def _raw_codes(self, name: str, label_codes: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        # Map level codes of one recoded variable back to raw codes
+        entry = self.spec[name]
+        levels = self.cube.levels[self.cube.factors.index(name)]
+        if 'bins' in entry:
+            labels = [str(label) for label in entry['labels']]
+            edges = np.asarray(entry['bins'], dtype=np.float64)
+            low = edges[[labels.index(str(level)) for level in levels]]
+            high = np.minimum(edges[[labels.index(str(level)) + 1 for level in levels]], AGE_MAX + 1)
+            return rng.integers(low[label_codes], high[label_codes]).astype(np.float64)
+
+        # Raw codes of every level, padded to a rectangle; pick one uniformly
+        options = [[code for code, label in entry['labels'].items() if str(label) == str(level)]
+                   for level in levels]
+        width = max(len(codes) for codes in options)
+        table = np.array([codes + codes[:1] * (width - len(codes)) for codes in options], dtype=np.float64)
+        counts = np.array([len(codes) for codes in options])
+        choice = (rng.random(len(label_codes)) * counts[label_codes]).astype(np.intp)
+        return table[label_codes, choice]
+
+    def sample(self, n_rows: int, rng: np.random.Generator, first_psu: int = 0,
+               n_strata: Optional[int] = None) -> pd.DataFrame:
+        """``n_rows`` raw records in the loader's column order and dtypes."""
+        cells = rng.choice(len(self.probabilities), size=n_rows, p=self.probabilities)
+        level_codes = np.unravel_index(cells, self.cube.counts.shape)
+
+        columns = {}
+        for name, codes in zip(self.cube.factors, level_codes):
+            source = self.spec[name]['source']
+            values = self._raw_codes(name, codes, rng)
+            other = OTHER_CODES.get(source)
+            if other and self.other_rate > 0:
+                replace = np.flatnonzero(rng.random(n_rows) < self.other_rate)
+                values[replace] = np.asarray(other)[rng.integers(0, len(other), len(replace))]
+            columns[source] = values
+        frame = pd.DataFrame({column: columns[column] for column in VARIABLES_TO_KEEP})
+
+        if self.design:
+            n_strata = n_strata or max(1, n_rows // STRATUM_SIZE)
+            frame['_LLCPWT'] = rng.lognormal(np.log(500), 1.0, n_rows)
+            frame['_STSTR'] = (rng.integers(0, n_strata, n_rows) + 11011).astype(np.float64)
+            # BRFSS uses one PSU per respondent
+            frame['_PSU'] = np.arange(first_psu, first_psu + n_rows, dtype=np.float64) + 2018000001
+        return downcast(frame)
+
+    def iter_chunks(self, n_rows: int, seed: Optional[int] = 1234,
+                    chunksize: int = 1_000_000) -> Iterator[pd.DataFrame]:
+        """``n_rows`` records in chunks with independent, reproducible streams."""
+        starts = range(0, n_rows, chunksize)
+        n_strata = max(1, n_rows // STRATUM_SIZE)
+        for start, chunk_seed in zip(starts, np.random.SeedSequence(seed).spawn(len(starts))):
+            size = min(chunksize, n_rows - start)
+            chunk = self.sample(size, np.random.default_rng(chunk_seed), start, n_strata)
+            chunk.index = pd.RangeIndex(start, start + size)
+            yield chunk
+
+    def generate(self, n_rows: int, seed: Optional[int] = 1234,
+                 chunksize: int = 1_000_000) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(n_rows, seed, chunksize))
+        return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def write_xport(frame: pd.DataFrame, path: str) -> str:
+    """Write ``frame`` as a SAS transport (XPT v5) file, like the BRFSS download.
+
+    Needs ``pyreadstat``.
+    """
+    try:
+        import pyreadstat
+    except ImportError as error:
+        raise ImportError("Writing XPT files requires pyreadstat (pip install pyreadstat)") from error
+    pyreadstat.write_xport(frame.astype(np.float64), path, file_format_version=5,
+                           table_name='LLCP')
+    return path
+
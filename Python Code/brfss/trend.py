@@ -0,0 +1,202 @@
+"""Prevalence of frequent mental distress by single year of age.
+
+The ``Age_Group`` buckets hide the shape of the age trend.  Here the
+respondents are counted per year of age (``_AGE80``, 18 to 80, where 80
+stands for 80 and older) with ``np.bincount``: one pass gives the
+respondents and the cases (``MentalHealth == 1``, 14+ days) of every age,
+optionally within the groups of a ``by`` column (e.g. ``YEAR`` of pooled
+files) and with survey weights.  Everything after that runs on the 63
+aggregated points per group:
+
+- Wilson or Clopper-Pearson intervals, computed for all ages at once (with
+  weights, on the Kish effective sample size of each age);
+- a LOWESS curve (local linear fits weighted by the respondents of each
+  age) or a smoothing spline weighted by the binomial standard errors.
+
+So the trend of millions of pooled records costs one ``bincount`` plus
+work on a few dozen numbers.
+"""
+
+from __future__ import annotations
+
+from statistics import NormalDist
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from brfss.contingency import encode
+
+MIN_AGE = 18
+MAX_AGE = 80    # _AGE80 is top-coded at 80
+INTERVALS = ('wilson', 'clopper-pearson')
+SMOOTHERS = ('lowess', 'spline', None)
+
+
+def age_prevalence(frame: pd.DataFrame, age: str = '_AGE80', outcome: str = 'MentalHealth',
+                   weights: Optional[str] = None, by: Optional[str] = None,
+                   min_age: int = MIN_AGE, max_age: int = MAX_AGE) -> pd.DataFrame:
+    """Respondents, cases and prevalence of ``outcome`` per year of age (and ``by`` group).
+
+    ``outcome`` is a 0/1 column; rows with a missing outcome or an age outside
+    ``[min_age, max_age]`` are left out.  With ``weights`` the prevalence is
+    weighted and ``n_effective`` is the Kish effective sample size.
+    """
+    ages = frame[age].to_numpy(dtype=np.float64)
+    cases = frame[outcome].to_numpy(dtype=np.float64)
+    valid = np.isfinite(cases) & (ages >= min_age) & (ages <= max_age)
+    n_ages = max_age - min_age + 1
+    index = (ages - min_age).astype(np.intp)
+
+    levels: list = [None]
+    if by is not None:
+        codes, levels = encode(frame[by])
+        valid &= codes >= 0
+        index = index + codes.astype(np.intp) * n_ages
+    index, cases = index[valid], cases[valid]
+    size = n_ages * len(levels)
+
+    table = {'age': np.tile(np.arange(min_age, max_age + 1), len(levels)),
+             'n': np.bincount(index, minlength=size),
+             'events': np.bincount(index, weights=cases, minlength=size).astype(np.int64)}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if weights is None:
+            table['prevalence'] = table['events'] / table['n']
+        else:
+            weight = frame[weights].to_numpy(dtype=np.float64)[valid]
+            total = np.bincount(index, weights=weight, minlength=size)
+            squares = np.bincount(index, weights=weight * weight, minlength=size)
+            table['prevalence'] = np.bincount(index, weights=weight * cases, minlength=size) / total
+            table['n_effective'] = total * total / squares
+
+    result = pd.DataFrame(table)
+    if by is not None:
+        result.insert(0, by, np.repeat(levels, n_ages))
+    return result
+
+
+def _z(alpha: float) -> float:
+    return NormalDist().inv_cdf(1 - alpha / 2)
+
+
+def wilson_interval(proportion: np.ndarray, n: np.ndarray,
+                    alpha: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+    """Wilson score interval of every proportion (NaN where ``n`` is 0)."""
+    proportion = np.asarray(proportion, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    z2 = _z(alpha) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = 1 + z2 / n
+        center = (proportion + z2 / (2 * n)) / denominator
+        half = np.sqrt(proportion * (1 - proportion) / n + z2 / (4 * n * n)) * np.sqrt(z2) / denominator
+    return center - half, center + half
+
+
+def clopper_pearson_interval(events: np.ndarray, n: np.ndarray,
+                             alpha: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact (Clopper-Pearson) interval of ``events`` out of ``n`` (NaN where ``n`` is 0).
+
+    ``events`` need not be integers, so weighted counts on the effective
+    sample size are accepted.
+    """
+    from scipy.special import betaincinv
+
+    events = np.asarray(events, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lower = np.where(events > 0, betaincinv(events, n - events + 1, alpha / 2), 0.0)
+        upper = np.where(events < n, betaincinv(events + 1, n - events, 1 - alpha / 2), 1.0)
+    empty = n <= 0
+    return np.where(empty, np.nan, lower), np.where(empty, np.nan, upper)
+
+
+def lowess(x: np.ndarray, y: np.ndarray, weights: Optional[np.ndarray] = None,
+           frac: float = 0.3, iterations: int = 0) -> np.ndarray:
+    """LOWESS fit at ``x``: local linear regressions with tricube kernels.
+
+    Each local fit uses the ``frac`` share of nearest points, weighted by the
+    kernel times ``weights`` (the respondents behind each point).
+    ``iterations`` adds robustifying passes with bisquare weights.  With
+    unit weights this is the fit of statsmodels' ``lowess(y, x, frac, it)``.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    weights = np.ones_like(x) if weights is None else np.asarray(weights, dtype=np.float64)
+    k = min(len(x), max(2, int(frac * len(x) + 1e-10)))
+
+    distances = np.abs(x[:, None] - x[None, :])
+    bandwidth = np.maximum(np.sort(distances, axis=1)[:, k - 1], 1e-12)
+    kernel = (1 - np.clip(distances / bandwidth[:, None], 0, 1) ** 3) ** 3
+
+    robustness = np.ones_like(x)
+    for iteration in range(iterations + 1):
+        local = kernel * (weights * robustness)[None, :]
+        total = local.sum(axis=1)
+        mean_x = local @ x / total
+        mean_y = local @ y / total
+        variance = local @ (x * x) / total - mean_x ** 2
+        covariance = local @ (x * y) / total - mean_x * mean_y
+        slope = np.where(variance > 1e-12, covariance / np.where(variance > 1e-12, variance, 1), 0.0)
+        fitted = mean_y + slope * (x - mean_x)
+        if iteration == iterations:
+            break
+        residuals = y - fitted
+        scale = np.median(np.abs(residuals))
+        if scale == 0:
+            break
+        robustness = (1 - np.clip(residuals / (6 * scale), -1, 1) ** 2) ** 2
+    return fitted
+
+
+def spline(x: np.ndarray, y: np.ndarray, weights: Optional[np.ndarray] = None,
+           smoothing: Optional[float] = None) -> np.ndarray:
+    """Cubic smoothing spline at ``x`` (``weights`` are 1 / standard error).
+
+    The default ``smoothing`` is the number of points, the expected sum of
+    squared standardized residuals of a correct fit.
+    """
+    from scipy.interpolate import UnivariateSpline
+
+    x = np.asarray(x, dtype=np.float64)
+    return UnivariateSpline(x, y, w=weights, k=3,
+                            s=len(x) if smoothing is None else smoothing)(x)
+
+
+def _smooth(table: pd.DataFrame, smoother: Optional[str], frac: float) -> np.ndarray:
+    n = table['n_effective'] if 'n_effective' in table else table['n']
+    observed = (n > 0).to_numpy()
+    ages, prevalence, n = (table['age'].to_numpy()[observed], table['prevalence'].to_numpy()[observed],
+                           n.to_numpy(dtype=np.float64)[observed])
+    if smoother is None or len(ages) < 4:
+        return np.full(len(table), np.nan)
+    if smoother == 'lowess':
+        fitted = lowess(ages, prevalence, n, frac)
+    else:
+        # Binomial standard errors at the overall prevalence (0 and 1 stay usable)
+        overall = np.average(prevalence, weights=n)
+        fitted = spline(ages, prevalence, np.sqrt(n / (overall * (1 - overall))))
+    # Ages without respondents are interpolated
+    return np.interp(table['age'].to_numpy(), ages, fitted)
+
+
+def age_trend(frame: pd.DataFrame, age: str = '_AGE80', outcome: str = 'MentalHealth',
+              weights: Optional[str] = None, by: Optional[str] = None,
+              interval: str = 'wilson', smoother: Optional[str] = 'lowess',
+              alpha: float = 0.05, frac: float = 0.3,
+              min_age: int = MIN_AGE, max_age: int = MAX_AGE) -> pd.DataFrame:
+    """:func:`age_prevalence` with ``lower``/``upper`` interval bounds and a ``smoothed`` curve."""
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval {interval!r}; choose from {', '.join(INTERVALS)}")
+    if smoother not in SMOOTHERS:
+        raise ValueError(f"Unknown smoother {smoother!r}; choose from lowess, spline or None")
+
+    table = age_prevalence(frame, age, outcome, weights, by, min_age, max_age)
+    n = (table['n_effective'] if weights is not None else table['n']).to_numpy(dtype=np.float64)
+    if interval == 'wilson':
+        table['lower'], table['upper'] = wilson_interval(table['prevalence'], n, alpha)
+    else:
+        table['lower'], table['upper'] = clopper_pearson_interval(table['prevalence'] * n, n, alpha)
+
+    groups = [table] if by is None else [group for _, group in table.groupby(by, sort=False)]
+    table['smoothed'] = np.concatenate([_smooth(group, smoother, frac) for group in groups])
+    return table
@@ -0,0 +1,160 @@
+"""Survey-weighted estimates with the BRFSS design variables.
+
+BRFSS is a stratified cluster sample: each respondent carries a final weight
+(``_LLCPWT``) and belongs to a stratum (``_STSTR``) and primary sampling unit
+(``_PSU``).  Everything here is built from grouped sums computed with
+``np.bincount(..., weights=...)``:
+
+- weighted contingency tables and the first-order Rao-Scott corrected
+  chi-square test, whose design effects come from Taylor-linearized
+  variances of the cell proportions (PSU totals, centred within strata);
+- weighted group means, e.g. of frequent mental distress by ``Age_Group``;
+- weighted correlations via :meth:`Correlation.from_data`.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from brfss.contingency import encode
+from brfss.correlation import Correlation
+from brfss.encoding import OneHotMatrix
+
+WEIGHT, STRATUM, PSU = '_LLCPWT', '_STSTR', '_PSU'
+
+
+class RaoScottResult(NamedTuple):
+    statistic: float     # Rao-Scott corrected chi-square
+    pvalue: float
+    dof: int
+    pearson: float       # uncorrected chi-square of the weighted proportions
+    mean_deff: float     # average generalized design effect used for the correction
+    table: pd.DataFrame  # weighted counts (estimated population totals)
+
+
+def _psu_codes(strata: np.ndarray, psus: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """PSU code of every row and the stratum code of every PSU."""
+    # PSU ids are only unique within a stratum
+    stratum_codes, _ = pd.factorize(strata)
+    psu_codes, psu_uniques = pd.factorize(pd.MultiIndex.from_arrays([stratum_codes, psus]))
+    return psu_codes, np.asarray(psu_uniques.get_level_values(0))
+
+
+def _linearized_variance(categories: np.ndarray, n_categories: int, weights: np.ndarray,
+                         psu_codes: np.ndarray, psu_strata: np.ndarray) -> np.ndarray:
+    """Design-based variance of the weighted proportion of every category."""
+    total = weights.sum()
+    proportion = np.bincount(categories, weights=weights, minlength=n_categories) / total
+
+    # PSU totals of the linearized values w * (1{category} - p) / W
+    n_psus = len(psu_strata)
+    category_totals = np.bincount(psu_codes * n_categories + categories, weights=weights,
+                                  minlength=n_psus * n_categories).reshape(n_psus, n_categories)
+    weight_totals = np.bincount(psu_codes, weights=weights, minlength=n_psus)
+    z = (category_totals - weight_totals[:, None] * proportion) / total
+
+    # Between-PSU variance within each stratum, scaled by n_h / (n_h - 1);
+    # strata with a single PSU contribute nothing
+    n_strata = psu_strata.max() + 1
+    psus_per_stratum = np.bincount(psu_strata, minlength=n_strata)
+    stratum_means = np.zeros((n_strata, n_categories))
+    np.add.at(stratum_means, psu_strata, z)
+    stratum_means /= np.maximum(psus_per_stratum, 1)[:, None]
+    squares = (z - stratum_means[psu_strata]) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(psus_per_stratum > 1, psus_per_stratum / (psus_per_stratum - 1), 0.0)
+    return (factor[psu_strata][:, None] * squares).sum(axis=0)
+
+
+def weighted_table(frame: pd.DataFrame, row: str, column: str,
+                   weight: str = WEIGHT) -> pd.DataFrame:
+    """Weighted two-way table (estimated population counts)."""
+    row_codes, row_levels = encode(frame[row])
+    col_codes, col_levels = encode(frame[column])
+    observed = (row_codes >= 0) & (col_codes >= 0)
+    cells = row_codes[observed] * len(col_levels) + col_codes[observed]
+    totals = np.bincount(cells, weights=frame[weight].to_numpy(dtype=np.float64)[observed],
+                         minlength=len(row_levels) * len(col_levels))
+    return pd.DataFrame(totals.reshape(len(row_levels), len(col_levels)),
+                        index=pd.Index(row_levels, name=row),
+                        columns=pd.Index(col_levels, name=column))
+
+
+def rao_scott_chi2(frame: pd.DataFrame, row: str, column: str, weight: str = WEIGHT,
+                   strata: str = STRATUM, psu: str = PSU) -> RaoScottResult:
+    """First-order Rao-Scott chi-square test of independence.
+
+    The Pearson statistic of the weighted proportions, ``n * sum (p_ij -
+    p_i. p_.j)^2 / (p_i. p_.j)``, is divided by the mean generalized design
+    effect (Rao & Scott, 1984, eq. 4.3) estimated from the cell, row and
+    column design effects, and referred to chi-square with ``(r - 1)(c - 1)``
+    dof.
+    """
+    row_codes, row_levels = encode(frame[row])
+    col_codes, col_levels = encode(frame[column])
+    observed = (row_codes >= 0) & (col_codes >= 0)
+    weights = frame[weight].to_numpy(dtype=np.float64)[observed]
+    psu_codes, psu_strata = _psu_codes(frame[strata].to_numpy()[observed],
+                                       frame[psu].to_numpy()[observed])
+    row_codes, col_codes = row_codes[observed], col_codes[observed]
+    n_rows, n_cols = len(row_levels), len(col_levels)
+    n = len(weights)
+
+    # Cells, rows and columns as one set of categories sharing the variance pass
+    categories = [(row_codes * n_cols + col_codes, n_rows * n_cols),
+                  (row_codes, n_rows), (col_codes, n_cols)]
+    proportions, deffs = [], []
+    for codes, size in categories:
+        p = np.bincount(codes, weights=weights, minlength=size) / weights.sum()
+        variance = _linearized_variance(codes, size, weights, psu_codes, psu_strata)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deff = np.where(p * (1 - p) > 0, variance / (p * (1 - p) / n), 0.0)
+        proportions.append(p)
+        deffs.append(deff)
+    (p_cells, p_rows, p_cols), (d_cells, d_rows, d_cols) = proportions, deffs
+
+    p_cells = p_cells.reshape(n_rows, n_cols)
+    independent = np.outer(p_rows, p_cols)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pearson = n * np.where(independent > 0, (p_cells - independent) ** 2 / independent, 0.0).sum()
+
+    dof = (n_rows - 1) * (n_cols - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cell_factor = np.where(independent > 0, p_cells / independent, 0.0).ravel()
+    mean_deff = ((cell_factor * (1 - p_cells.ravel()) * d_cells).sum()
+                 - ((1 - p_rows) * d_rows).sum()
+                 - ((1 - p_cols) * d_cols).sum()) / dof
+    statistic = pearson / mean_deff
+    table = pd.DataFrame(p_cells * weights.sum(), index=pd.Index(row_levels, name=row),
+                         columns=pd.Index(col_levels, name=column))
+    return RaoScottResult(float(statistic), float(stats.chi2.sf(statistic, dof)), dof,
+                          float(pearson), float(mean_deff), table)
+
+
+def weighted_group_means(frame: pd.DataFrame, group: str, value: str,
+                         weight: str = WEIGHT) -> pd.DataFrame:
+    """Weighted mean of ``value`` per level of ``group``, with sample sizes."""
+    codes, levels = encode(frame[group])
+    values = frame[value].to_numpy(dtype=np.float64)
+    weights = frame[weight].to_numpy(dtype=np.float64)
+    observed = (codes >= 0) & ~np.isnan(values)
+    codes, values, weights = codes[observed], values[observed], weights[observed]
+
+    weight_totals = np.bincount(codes, weights=weights, minlength=len(levels))
+    return pd.DataFrame({
+        'weighted_mean': np.bincount(codes, weights=weights * values, minlength=len(levels)) / weight_totals,
+        'unweighted_mean': (np.bincount(codes, weights=values, minlength=len(levels))
+                            / np.bincount(codes, minlength=len(levels))),
+        'weight_total': weight_totals,
+        'respondents': np.bincount(codes, minlength=len(levels)),
+    }, index=pd.Index(levels, name=group))
+
+
+def weighted_correlation(data: Union[OneHotMatrix, pd.DataFrame],
+                         weights: np.ndarray) -> Correlation:
+    """Weighted Pearson correlations of the encoded (or numeric) columns."""
+    return Correlation.from_data(data, weights=weights)
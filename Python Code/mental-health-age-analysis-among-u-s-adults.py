@@ -28,16 +28,30 @@
 # In[1]:
 
 
+import multiprocessing
+import os
+
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import statsmodels.api as sm
-import matplotlib.pyplot as plt
 
-from statsmodels.formula.api import ols
-from imblearn.over_sampling import SMOTE
-from scipy.stats import chi2_contingency
-from imblearn.under_sampling import RandomUnderSampler
+from brfss.anova import anova_type2
+from brfss.bootstrap import bootstrap_replicates, confidence_intervals
+from brfss.cache import StageCache, cache_key, file_fingerprint
+from brfss.contingency import CountCube, chi2_summary, chi2_tests
+from brfss.correlation import Correlation
+from brfss.dedup import RowDeduplicator
+from brfss.encoding import OneHotMatrix, one_hot_encode
+from brfss.figures import bar, count_bar, heatmap, histogram, render_figures, trend
+from brfss.filters import VALIDITY_RULES, apply_validity_rules
+from brfss.loader import DESIGN_VARIABLES, LOADER_VERSION, VARIABLES_TO_KEEP, load_brfss
+from brfss.logistic import logistic_regression
+from brfss.paths import IMAGES_DIR
+from brfss.permutation import permutation_tests
+from brfss.recode import RECODE_SPEC, recode
+from brfss.resample import resample_indices
+from brfss.stats import StreamingStats, iter_frame_chunks, zscore_outliers
+from brfss.trend import age_trend
+from brfss.weighted import rao_scott_chi2, weighted_group_means
 
 
 # # Import Dataset
@@ -47,21 +61,30 @@ from imblearn.under_sampling import RandomUnderSampler
 
 file_path = '/kaggle/input/behavioral-risk-factor-surveillance-system/LLCP2018.XPT'
 
-BRFSS = pd.read_sas(file_path)
+# The process pools below (bootstrap, permutations, figures) start workers that re-import
+# this script unless they are forked, and the script has no __main__ guard: without
+# fork (macOS, Windows) they run in-process instead
+max_workers = None if multiprocessing.get_start_method() == 'fork' else 1
 
-# Create chunks of size 10,000 
-chunk_size = 10000
-BRFSS_chunks = [Original_BRFSS[i:i + chunk_size] 
-                for i in range(0, Original_BRFSS.shape[0], chunk_size)]
+# Decoded stages are cached as Feather files keyed on the source file, the loader
+# version and the parameters; every later stage key builds on this one
+cache = StageCache('brfss_cache')
+raw_key = cache_key(file_fingerprint(file_path), LOADER_VERSION,
+                    columns=VARIABLES_TO_KEEP + DESIGN_VARIABLES, dedup=True, engine='native')
 
-# Remove duplicates for each chunk (if any) and concatenate them
-BRFSS_chunks = [chunk.drop_duplicates() for chunk in BRFSS_chunks]
+# Remove duplicate survey records (across the whole file) while the chunks stream in
+dedup = RowDeduplicator()
 
-# Concatenate all chunks into a single DataFrame
-BRFSS = pd.concat(BRFSS_chunks, ignore_index=True)
+# Stream the XPT file in chunks of 10,000 records, keeping only the study variables
+# and the survey design variables (final weight, stratum and PSU)
+# (reloaded memory-mapped from the cache when the source file has not changed)
+BRFSS = cache.get_or_compute(
+    'raw', raw_key,
+    lambda: load_brfss(file_path, columns=VARIABLES_TO_KEEP + DESIGN_VARIABLES,
+                       chunksize=10000, dedup=dedup, engine='native'))
 
-# Optional: Remove duplicates from the final DataFrame (if needed)
-BRFSS = BRFSS.drop_duplicates()
+# Number of duplicate records removed (0 when loaded from the cache)
+print("Duplicate records removed:", dedup.duplicates)
 
 
 # #### **Variables used in this study and questions that were asked:**
@@ -125,9 +148,9 @@ BRFSS = BRFSS.drop_duplicates()
 # In[3]:
 
 
-# Keep only selected variabels in the dataset
-variables_to_keep = ['VETERAN3', 'GENHLTH', 'EDUCA', '_AGE80', '_MENT14D']
-BRFSS_1 = BRFSS.loc[:, variables_to_keep]
+# Keep only selected variabels in the dataset (already projected while loading);
+# the design variables are carried along for the survey-weighted estimates
+BRFSS_1 = BRFSS.loc[:, VARIABLES_TO_KEEP + DESIGN_VARIABLES]
 
 print(BRFSS_1)
 
@@ -186,34 +209,26 @@ print(missing_num_values_after_imputation)
 # In[7]:
 
 
-# Calculate z-scores for each column
-z_scores = np.abs((BRFSS_1 - BRFSS_1.mean()) / BRFSS_1.std())
+# Accumulate mean, standard deviation, quartiles and mode in one pass over 10,000-row chunks
+summary_stats = StreamingStats(VARIABLES_TO_KEEP).update_all(iter_frame_chunks(BRFSS_1, 10000))
 
 # Define a threshold for outlier detection
 threshold = 3
 
-# Find outliers
-outliers = (z_scores > threshold).any(axis=1)
+# Find outliers (second pass; z-scores are checked column by column)
+outliers = zscore_outliers(iter_frame_chunks(BRFSS_1, 10000), summary_stats, threshold)
 
 # Display rows containing outliers
 print("Rows containing outliers:")
-print(BRFSS_1[outliers])
+print(BRFSS_1.loc[outliers])
 
 
 # In[8]:
 
 
-# Statistical description including mean, median, and quartiles
-description = BRFSS_1.describe(percentiles=[.25, .50, .75])
-
-# Calculate mode
-mode = BRFSS_1.mode().iloc[0]  # Mode might return multiple values, so we take the first one
-
-# Transpose the description DataFrame
-description = description.transpose()
-
-# Add mode to description
-description['mode'] = mode
+# Statistical description including mean, median, quartiles, and mode
+# (exact, from the value counts accumulated above)
+description = summary_stats.describe(percentiles=[.25, .50, .75])
 
 # Print statistical description
 print(description)
@@ -231,52 +246,12 @@ print(BRFSS_1['VETERAN3'].unique())
 # In[10]:
 
 
-# Create a histogram
-plt.hist(BRFSS_1['VETERAN3'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('VETERAN3')
-plt.ylabel('Frequency')
-plt.title('Histogram of VETERAN3 Variable')
-
-# Show the plot
-plt.show()
-
-
-# In[11]:
-
-
-# Remove categories 7 and 9 from the 'VETERAN3' variable
-BRFSS_1 = BRFSS_1[(BRFSS_1['VETERAN3'] != 7) & 
-                           (BRFSS_1['VETERAN3'] != 9)]
+# Figures are collected as small specs of pre-computed counts and rendered
+# together, headless and in parallel, at the end of the analysis
+figures = []
 
-# Print unique categories in the 'VETERAN3' variable after removal
-print(BRFSS_1['VETERAN3'].unique())
-
-
-# In[12]:
-
-
-#Convert to categorical where 1 = Yes & 2 = No
-BRFSS_1['Veteran'] = BRFSS_1['VETERAN3'].replace({1: 'Yes', 2: 'No'})
-
-# Print unique categories in the 'Veteran' variable after conversion
-print(BRFSS_1['Veteran'].unique())
-
-
-# In[13]:
-
-
-# Create a histogram
-plt.hist(BRFSS_1['Veteran'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('Veteran')
-plt.ylabel('Frequency')
-plt.title('Histogram of Veteran Variable')
-
-# Show the plot
-plt.show()
+# Histogram counts of the raw codes
+figures.append(histogram(BRFSS_1['VETERAN3'], bins=9))
 
 
 # #### 'GENHLTH'
@@ -291,54 +266,8 @@ print(BRFSS_1['GENHLTH'].unique())
 # In[15]:
 
 
-# Create a histogram
-plt.hist(BRFSS_1['GENHLTH'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('GENHLTH')
-plt.ylabel('Frequency')
-plt.title('Histogram of GENHLTH Variable')
-
-# Show the plot
-plt.show()
-
-
-# In[16]:
-
-
-# Keep only categories 1, 3, and 5 in the 'GENHLTH' variable
-BRFSS_1 = BRFSS_1[(BRFSS_1['GENHLTH'] == 1) | (BRFSS_1['GENHLTH'] == 3) | (BRFSS_1['GENHLTH'] == 5)]
-
-# Print unique categories in the 'GENHLTH' variable after filtering
-print(BRFSS_1['GENHLTH'].unique())
-
-
-# In[17]:
-
-
-# Define mapping for categorical labels
-category_mapping = {1: 'Excellent', 3: 'Good', 5: 'Poor'}
-
-# Convert values to categorical labels
-BRFSS_1['GeneralHealth'] = BRFSS_1['GENHLTH'].replace(category_mapping)
-
-# Print unique categories in the 'GeneralHealth' variable after conversion
-print(BRFSS_1['GeneralHealth'].unique())
-
-
-# In[18]:
-
-
-# Create a histogram
-plt.hist(BRFSS_1['GeneralHealth'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('GeneralHealth')
-plt.ylabel('Frequency')
-plt.title('Histogram of GeneralHealth Variable')
-
-# Show the plot
-plt.show()
+# Histogram counts of the raw codes (rendered with the other figures at the end)
+figures.append(histogram(BRFSS_1['GENHLTH'], bins=9))
 
 
 # #### 'EDUCA'
@@ -353,63 +282,8 @@ print(BRFSS_1['EDUCA'].unique())
 # In[20]:
 
 
-# Create a histogram
-plt.hist(BRFSS_1['EDUCA'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('EDUCA')
-plt.ylabel('Frequency')
-plt.title('Histogram of EDUCA Variable')
-
-# Show the plot
-plt.show()
-
-
-# In[21]:
-
-
-# Keep only categories 2, 3, 4, 5, and 6 in the 'EDUCA' variable
-BRFSS_1 = BRFSS_1[(BRFSS_1['EDUCA'] >= 2) & (BRFSS_1['EDUCA'] <= 6)]
-
-# Print unique categories in the 'EDUCA' variable after filtering
-print(BRFSS_1['EDUCA'].unique())
-
-
-# In[22]:
-
-
-# Define the mapping of categories to educational levels
-edu_mapping = {
-    2: 'Elementary',
-    3: 'High_School',
-    4: 'High_School',
-    5: 'College',
-    6: 'College'
-}
-
-# Convert 'EDUCA' to categorical based on the defined mapping
-BRFSS_1['Education'] = BRFSS_1['EDUCA'].replace(edu_mapping)
-
-# Drop the original 'EDUCA' column
-BRFSS_1.drop(columns=['EDUCA'], inplace=True)
-
-# Print unique categories in the 'Education' variable after conversion
-print(BRFSS_1['Education'].unique())
-
-
-# In[23]:
-
-
-# Create a histogram
-plt.hist(BRFSS_1['Education'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('Education')
-plt.ylabel('Frequency')
-plt.title('Histogram of Education Variable')
-
-# Show the plot
-plt.show()
+# Histogram counts of the raw codes (rendered with the other figures at the end)
+figures.append(histogram(BRFSS_1['EDUCA'], bins=9))
 
 
 # #### '_AGE80'
@@ -424,46 +298,8 @@ print(BRFSS_1['_AGE80'].unique())
 # In[25]:
 
 
-# Create a histogram
-plt.hist(BRFSS_1['_AGE80'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('_AGE80')
-plt.ylabel('Frequency')
-plt.title('Histogram of _AGE80 Variable')
-
-# Show the plot
-plt.show()
-
-
-# In[26]:
-
-
-# Create a new column 'Age_Group' with the age groups
-BRFSS_1.loc[BRFSS_1['_AGE80'].between(18, 34), 'Age_Group'] = '18_to_34' #ages between 18-34
-BRFSS_1.loc[BRFSS_1['_AGE80'].between(35, 54), 'Age_Group'] = '35_to_54'#ages between 35-54
-BRFSS_1.loc[BRFSS_1['_AGE80'] >= 55, 'Age_Group'] = '55' # 55 = ages 55 and up
-
-# Convert 'Age_Group' to categorical
-BRFSS_1['Age_Group'] = BRFSS_1['Age_Group'].astype('category')
-
-# Print unique categories in the 'Age_Group' column after conversion
-print(BRFSS_1['Age_Group'].unique())
-
-
-# In[27]:
-
-
-# Create a histogram
-plt.hist(BRFSS_1['Age_Group'], bins=9, color='steelblue', edgecolor='black')
-
-# Add labels and title
-plt.xlabel('Age_Group')
-plt.ylabel('Frequency')
-plt.title('Histogram of Age_Group Variable')
-
-# Show the plot
-plt.show()
+# Histogram counts of the raw codes (rendered with the other figures at the end)
+figures.append(histogram(BRFSS_1['_AGE80'], bins=9))
 
 
 # #### '_MENT14D'
@@ -478,49 +314,58 @@ print(BRFSS_1['_MENT14D'].unique())
 # In[29]:
 
 
-# Create a histogram
-plt.hist(BRFSS_1['_MENT14D'], bins=9, color='steelblue', edgecolor='black')
+# Histogram counts of the raw codes (rendered with the other figures at the end)
+figures.append(histogram(BRFSS_1['_MENT14D'], bins=9))
 
-# Add labels and title
-plt.xlabel('_MENT14D')
-plt.ylabel('Frequency')
-plt.title('Histogram of _MENT14D Variable')
 
-# Show the plot
-plt.show()
+# ### Remove invalid categories
+#  - **VETERAN3:** remove 7 and 9
+#  - **GENHLTH:** keep only 1, 3, and 5
+#  - **EDUCA:** keep only 2, 3, 4, 5, and 6
+#  - **_MENT14D:** remove 9
 
+# In[31]:
 
-# In[30]:
 
+# Apply all validity rules with one combined mask (run below, when the cleaned dataset is not cached)
+def remove_invalid_categories(frame):
+    valid, exclusion_stats = apply_validity_rules(frame, VALIDITY_RULES)
 
-# Convert 'MENTHLTH' column to numeric type
-BRFSS_1['MentalHealth'] = pd.to_numeric(BRFSS_1['_MENT14D'], errors='coerce')
+    # Print the number of rows excluded by each rule
+    print(exclusion_stats)
+    return valid
 
-# Assign categories between 0 and 13 to '0= 0-13 days' and categories 14 and above to '1= 14+ days'
-BRFSS_1['MentalHealth'] = BRFSS_1['MentalHealth'].apply(lambda x: '0' if x <= 13 else ('1' if x >= 14 else None))
 
-# Print unique values of the 'MentalHealth' column after modification
-print(BRFSS_1['MentalHealth'].unique())
+# ### Recoding
+# All variables are recoded in a single pass from the mappings in `RECODE_SPEC`:
+#  - **Veteran:** 1 = Yes, 2 = No
+#  - **GeneralHealth:** 1 = Excellent, 3 = Good, 5 = Poor
+#  - **Education:** 2 = Elementary, 3-4 = High_School, 5-6 = College
+#  - **Age_Group:** 18-34 = 18_to_34, 35-54 = 35_to_54, 55 and up = 55
+#  - **MentalHealth:** 1-2 = 0 (0-13 days), 3 = 1 (14+ days)
 
+# In[ ]:
 
-# In[31]:
 
+# Remove the invalid categories, convert the coded variables to categorical labels
+# and drop the original 'EDUCA' column
+# (reloaded memory-mapped from the cache when the raw data and the rules have not changed)
+BRFSS_1_key = cache_key(raw_key, stage='BRFSS_1', validity_rules=VALIDITY_RULES, recode_spec=RECODE_SPEC)
+BRFSS_1 = cache.get_or_compute(
+    'BRFSS_1', BRFSS_1_key,
+    lambda: recode(remove_invalid_categories(BRFSS_1), RECODE_SPEC).drop(columns=['EDUCA']))
 
-# Filter out rows where _MENT14D is equal to 9
-BRFSS_1 = BRFSS_1[BRFSS_1['_MENT14D'] != 9]
+# Print unique categories in each recoded variable
+for column in RECODE_SPEC:
+    print(column, BRFSS_1[column].unique())
 
-# Define a mapping dictionary for relabeling categories
-mapping = {
-    1 : 0, #Combine categories 1 and 2 into 0
-    2 : 0,
-    3 : 1 #Relabeling category 3 to 1
-}
 
-# Apply the mapping to the '_MENT14D' variable
-BRFSS_1['MentalHealth'] = BRFSS_1['_MENT14D'].map(mapping)
+# In[13]:
+
 
-# Print the unique categories in the MentalHealth variable after transformation
-print(BRFSS_1['MentalHealth'].unique())
+# One bar per category of each recoded categorical variable
+for column in ['Veteran', 'GeneralHealth', 'Education', 'Age_Group']:
+    figures.append(histogram(BRFSS_1[column]))
 
 
 # In[32]:
@@ -535,15 +380,9 @@ BRFSS_1['MentalHealth'].value_counts()
 # In[33]:
 
 
-# Example of creating a bar plot using seaborn
-plt.figure(figsize=(10, 6))
-sns.countplot(x='MentalHealth', data=BRFSS_1)
-plt.title('BRFSS Mental Health')
-plt.xlabel('Mental Health Status')
-plt.ylabel('Count')
-plt.xticks(rotation=45)  # Rotate x-axis labels if necessary
-plt.tight_layout()
-plt.show()
+# Count of respondents in each MentalHealth class
+figures.append(count_bar(BRFSS_1['MentalHealth'], 'BRFSS Mental Health', 'BRFSS Mental Health',
+                         xlabel='Mental Health Status', rotation=45))
 
 
 # In[34]:
@@ -551,41 +390,31 @@ plt.show()
 
 # Balance the target variable
 
-# Separate features and target variable
-X = BRFSS_1.drop('MentalHealth', axis=1)
-y = BRFSS_1['MentalHealth']
+# Draw the row positions of a random undersample of the majority class
+resampled_positions = resample_indices(BRFSS_1['MentalHealth'], method='under', seed=1234)
 
-# Initialize and fit to the data
-rus = RandomUnderSampler(random_state=1234)
-X_resampled, y_resampled = rus.fit_resample(X, y)
-
-# Calculate the class distribution after resampling
-mental_health_resampled_counts = pd.Series(y_resampled).value_counts()
-
-# Plot the bar plot
-plt.figure(figsize=(8, 6))
-mental_health_resampled_counts.plot(kind='bar', color=['steelblue', 'forestgreen'])
-plt.title('Mental Health Distribution After Resampling')
-plt.xlabel('Mental Health Status')
-plt.ylabel('Count')
-plt.xticks(rotation=0)  # Rotate x-axis labels if necessary
-plt.show()
+# Class distribution after resampling
+figures.append(count_bar(BRFSS_1['MentalHealth'].iloc[resampled_positions],
+                         'Mental Health Distribution After Resampling',
+                         'Mental Health Distribution After Resampling',
+                         xlabel='Mental Health Status'))
 
 
 # In[35]:
 
 
-#Combine X_resampled and y_resampled back into a new DataFrame
-resampled_df = pd.concat([X_resampled, y_resampled], axis=1)
+# Select the resampled rows once, keeping only the recoded columns
+# (the raw 'VETERAN3', 'GENHLTH', '_AGE80', and '_MENT14D' codes are not needed anymore;
+# reloaded from the cache on later runs)
+BRFSS_2_columns = ['Veteran', 'GeneralHealth', 'Education', 'Age_Group', 'MentalHealth']
+BRFSS_2_key = cache_key(BRFSS_1_key, stage='BRFSS_2', method='under', seed=1234)
+BRFSS_2 = cache.get_or_compute(
+    'BRFSS_2', BRFSS_2_key,
+    lambda: BRFSS_1.iloc[resampled_positions,
+                         [BRFSS_1.columns.get_loc(column) for column in BRFSS_2_columns]])
 
 #Verify
-print(resampled_df['MentalHealth'].value_counts())
-
-
-# In[36]:
-
-
-BRFSS_2 = resampled_df.copy()
+print(BRFSS_2['MentalHealth'].value_counts())
 
 
 # In[37]:
@@ -594,30 +423,40 @@ BRFSS_2 = resampled_df.copy()
 print(BRFSS_2)
 
 
-# In[38]:
+# # Pearson Chi-Square Test
+# #### Exposure Variable: Age_Group
+# #### Control Variables: Veteran, GeneralHealth,and Education
 
+# In[ ]:
 
-# Drop the specified columns
-BRFSS_2.drop(columns=['VETERAN3', 'GENHLTH', '_AGE80', '_MENT14D'], inplace=True)
 
-# Print the DataFrame after dropping the columns
-print(BRFSS_2)
+# Count the joint distribution of all variables once; every contingency table is a sum over this cube
+contingency_cube = CountCube.from_frame(BRFSS_2, ['Age_Group', 'Veteran', 'GeneralHealth', 'Education', 'MentalHealth'])
 
+# Perform all chi-square tests in one batch
+chi_square_results = chi2_tests(contingency_cube, [
+    ('Age_Group', 'Veteran'),
+    ('Age_Group', 'GeneralHealth'),
+    ('Age_Group', 'Education'),
+    ('MentalHealth', 'Veteran'),
+    ('MentalHealth', 'Age_Group'),
+    ('MentalHealth', 'GeneralHealth'),
+    ('MentalHealth', 'Education'),
+])
 
-# # Pearson Chi-Square Test
-# #### Exposure Variable: Age_Group
-# #### Control Variables: Veteran, GeneralHealth,and Education
+# Print a summary of all tests
+print(chi2_summary(chi_square_results))
 
 # #### Chi-Square test for 'Age_Group' and 'Veteran'
 
 # In[39]:
 
 
-# Create contingency table between 'Age_Group' and 'Veteran'
-contingency_agegroup_veteran = pd.crosstab(BRFSS_2['Age_Group'], BRFSS_2['Veteran'])
+# Contingency table between 'Age_Group' and 'Veteran' (summed from the count cube)
+contingency_agegroup_veteran = contingency_cube.table('Age_Group', 'Veteran')
 
-# Perform chi-square test for 'Age_Group' and 'Veteran'
-chi2_agegroup_veteran, p_agegroup_veteran, dof_agegroup_veteran, expected_agegroup_veteran = chi2_contingency(contingency_agegroup_veteran)
+# Chi-square test for 'Age_Group' and 'Veteran'
+chi2_agegroup_veteran, p_agegroup_veteran, dof_agegroup_veteran, expected_agegroup_veteran = chi_square_results[('Age_Group', 'Veteran')]
 
 # Print results
 print("Chi-square statistic for Age_Group and Veteran:", chi2_agegroup_veteran)
@@ -631,11 +470,11 @@ print("Expected frequencies for Age_Group and Veteran:\n", expected_agegroup_vet
 # In[40]:
 
 
-# Create contingency table between 'Age_Group' and 'GeneralHealth'
-contingency_agegroup_generalhealth = pd.crosstab(BRFSS_2['Age_Group'], BRFSS_2['GeneralHealth'])
+# Contingency table between 'Age_Group' and 'GeneralHealth' (summed from the count cube)
+contingency_agegroup_generalhealth = contingency_cube.table('Age_Group', 'GeneralHealth')
 
-# Perform chi-square test for 'Age_Group' and 'GeneralHealth'
-chi2_agegroup_generalhealth, p_agegroup_generalhealth, dof_agegroup_generalhealth, expected_agegroup_generalhealth = chi2_contingency(contingency_agegroup_generalhealth)
+# Chi-square test for 'Age_Group' and 'GeneralHealth'
+chi2_agegroup_generalhealth, p_agegroup_generalhealth, dof_agegroup_generalhealth, expected_agegroup_generalhealth = chi_square_results[('Age_Group', 'GeneralHealth')]
 
 # Print results
 print("Chi-square statistic for Age_Group and GeneralHealth:", chi2_agegroup_generalhealth)
@@ -649,11 +488,11 @@ print("Expected frequencies for Age_Group and GeneralHealth:\n", expected_agegro
 # In[41]:
 
 
-# Create contingency table between 'Age_Group' and 'Education'
-contingency_agegroup_education = pd.crosstab(BRFSS_2['Age_Group'], BRFSS_2['Education'])
+# Contingency table between 'Age_Group' and 'Education' (summed from the count cube)
+contingency_agegroup_education = contingency_cube.table('Age_Group', 'Education')
 
-# Perform chi-square test for 'Age_Group' and 'Education'
-chi2_agegroup_education, p_agegroup_education, dof_agegroup_education, expected_agegroup_education = chi2_contingency(contingency_agegroup_education)
+# Chi-square test for 'Age_Group' and 'Education'
+chi2_agegroup_education, p_agegroup_education, dof_agegroup_education, expected_agegroup_education = chi_square_results[('Age_Group', 'Education')]
 
 # Print results
 print("Chi-square statistic for Age_Group and Education:", chi2_agegroup_education)
@@ -671,11 +510,11 @@ print("Expected frequencies for Age_Group and Education:\n", expected_agegroup_e
 # In[42]:
 
 
-# Create contingency table between 'MentalHealth' and 'Veteran'
-contingency_mentalhealth_veteran = pd.crosstab(BRFSS_2['MentalHealth'], BRFSS_2['Veteran'])
+# Contingency table between 'MentalHealth' and 'Veteran' (summed from the count cube)
+contingency_mentalhealth_veteran = contingency_cube.table('MentalHealth', 'Veteran')
 
-# Perform chi-square test for 'MentalHealth' and 'Veteran'
-chi2_mentalhealth_veteran, p_mentalhealth_veteran, dof_mentalhealth_veteran, expected_mentalhealth_veteran = chi2_contingency(contingency_mentalhealth_veteran)
+# Chi-square test for 'MentalHealth' and 'Veteran'
+chi2_mentalhealth_veteran, p_mentalhealth_veteran, dof_mentalhealth_veteran, expected_mentalhealth_veteran = chi_square_results[('MentalHealth', 'Veteran')]
 
 # Print results
 print("Chi-square statistic for MentalHealth and Veteran:", chi2_mentalhealth_veteran)
@@ -689,11 +528,11 @@ print("Expected frequencies for MentalHealth and Veteran:\n", expected_mentalhea
 # In[43]:
 
 
-# Create contingency table between 'MentalHealth' and 'Age_Group'
-contingency_mentalhealth_age_group = pd.crosstab(BRFSS_2['MentalHealth'], BRFSS_2['Age_Group'])
+# Contingency table between 'MentalHealth' and 'Age_Group' (summed from the count cube)
+contingency_mentalhealth_age_group = contingency_cube.table('MentalHealth', 'Age_Group')
 
-# Perform chi-square test for 'MentalHealth' and 'Age_Group'
-chi2_mentalhealth_age_group, p_mentalhealth_age_group, dof_mentalhealth_age_group, expected_mentalhealth_age_group = chi2_contingency(contingency_mentalhealth_age_group)
+# Chi-square test for 'MentalHealth' and 'Age_Group'
+chi2_mentalhealth_age_group, p_mentalhealth_age_group, dof_mentalhealth_age_group, expected_mentalhealth_age_group = chi_square_results[('MentalHealth', 'Age_Group')]
 
 # Print results
 print("Chi-square statistic for MentalHealth and Age_Group:", chi2_mentalhealth_age_group)
@@ -707,11 +546,11 @@ print("Expected frequencies for MentalHealth and Age_Group:\n", expected_mentalh
 # In[44]:
 
 
-# Create contingency table between 'MentalHealth' and 'GeneralHealth'
-contingency_mentalhealth_generalhealth = pd.crosstab(BRFSS_2['MentalHealth'], BRFSS_2['GeneralHealth'])
+# Contingency table between 'MentalHealth' and 'GeneralHealth' (summed from the count cube)
+contingency_mentalhealth_generalhealth = contingency_cube.table('MentalHealth', 'GeneralHealth')
 
-# Perform chi-square test for 'MentalHealth' and 'GeneralHealth'
-chi2_mentalhealth_generalhealth, p_mentalhealth_generalhealth, dof_mentalhealth_generalhealth, expected_mentalhealth_generalhealth = chi2_contingency(contingency_mentalhealth_generalhealth)
+# Chi-square test for 'MentalHealth' and 'GeneralHealth'
+chi2_mentalhealth_generalhealth, p_mentalhealth_generalhealth, dof_mentalhealth_generalhealth, expected_mentalhealth_generalhealth = chi_square_results[('MentalHealth', 'GeneralHealth')]
 
 # Print results
 print("Chi-square statistic for MentalHealth and GeneralHealth:", chi2_mentalhealth_generalhealth)
@@ -725,11 +564,11 @@ print("Expected frequencies for MentalHealth and GeneralHealth:\n", expected_men
 # In[45]:
 
 
-# Create contingency table between 'MentalHealth' and 'Education'
-contingency_mentalhealth_education = pd.crosstab(BRFSS_2['MentalHealth'], BRFSS_2['Education'])
+# Contingency table between 'MentalHealth' and 'Education' (summed from the count cube)
+contingency_mentalhealth_education = contingency_cube.table('MentalHealth', 'Education')
 
-# Perform chi-square test for 'MentalHealth' and 'Education'
-chi2_mentalhealth_education, p_mentalhealth_education, dof_mentalhealth_education, expected_mentalhealth_education = chi2_contingency(contingency_mentalhealth_education)
+# Chi-square test for 'MentalHealth' and 'Education'
+chi2_mentalhealth_education, p_mentalhealth_education, dof_mentalhealth_education, expected_mentalhealth_education = chi_square_results[('MentalHealth', 'Education')]
 
 # Print results
 print("Chi-square statistic for MentalHealth and Education:", chi2_mentalhealth_education)
@@ -761,8 +600,18 @@ print(BRFSS_2.dtypes)
 # In[48]:
 
 
-# Perform one-hot encoding for categorical variables
-BRFSS_3 = pd.get_dummies(BRFSS_2, columns=['Veteran', 'GeneralHealth', 'Education', 'Age_Group'])
+# Perform one-hot encoding for categorical variables (stored as a sparse uint8 matrix),
+# or reload the matrix cached in a binary .npz file by an earlier run
+BRFSS_3_key = cache_key(BRFSS_2_key, stage='BRFSS_3')
+BRFSS_3_path = cache.path('BRFSS_3', BRFSS_3_key, 'npz')
+if os.path.exists(BRFSS_3_path):
+    BRFSS_3_encoded = OneHotMatrix.load(BRFSS_3_path)
+else:
+    BRFSS_3_encoded = one_hot_encode(BRFSS_2, ['Veteran', 'GeneralHealth', 'Education', 'Age_Group'])
+    BRFSS_3_encoded.save(BRFSS_3_path)
+
+# View the encoded matrix as a DataFrame with sparse uint8 columns
+BRFSS_3 = BRFSS_3_encoded.to_frame(sparse_columns=True)
 
 # Check the data types after one-hot encoding
 print(BRFSS_3.dtypes)
@@ -777,18 +626,18 @@ print(BRFSS_3.columns)
 # In[50]:
 
 
-# Define the formula for the ANOVA
-formula = 'MentalHealth ~ C(Veteran_No) + C(Veteran_Yes) + C(GeneralHealth_Excellent) + C(GeneralHealth_Good) + C(GeneralHealth_Poor) + C(Education_College) + C(Education_Elementary) + C(Education_High_School) + C(Age_Group_18_to_34) + C(Age_Group_35_to_54) + C(Age_Group_55)'
+# Define the factors for the ANOVA
+# (each variable enters once: its one-hot columns always sum to 1, so listing every
+# dummy column as its own term would make the model rank-deficient)
+anova_factors = ['Veteran', 'GeneralHealth', 'Education', 'Age_Group']
 
 
 # In[51]:
 
 
-# Fit the ANOVA model
-model = ols(formula, data=BRFSS_3).fit()
-
-# Perform ANOVA
-anova_table = sm.stats.anova_lm(model, typ=2)
+# Perform a Type II ANOVA from the per-cell counts, means and sums of squares
+# (same table as anova_lm(ols('MentalHealth ~ C(Veteran) + ...'), typ=2))
+anova_table = anova_type2(BRFSS_3_encoded, 'MentalHealth', anova_factors)
 
 # Print the ANOVA table
 print(anova_table)
@@ -801,21 +650,29 @@ print(anova_table)
 anova_table_plot = anova_table.drop(index='Residual')
 
 # Plot the ANOVA results
-plt.figure(figsize=(10, 6))
-sns.barplot(x=anova_table_plot.index, y='F', data=anova_table_plot)
-plt.title('ANOVA Results')
-plt.xlabel('Variable')
-plt.ylabel('F-value')
-plt.xticks(rotation=45, ha='right')
-plt.show()
-
-plt.figure(figsize=(10, 6))
-sns.barplot(x=anova_table_plot.index, y='PR(>F)', data=anova_table_plot)
-plt.title('ANOVA Results')
-plt.xlabel('Variable')
-plt.ylabel('p-value')
-plt.xticks(rotation=45, ha='right')
-plt.show()
+figures.append(bar('ANOVA Results (F-value)', anova_table_plot.index, anova_table_plot['F'],
+                   'ANOVA Results', xlabel='Variable', ylabel='F-value', rotation=45))
+figures.append(bar('ANOVA Results (p-value)', anova_table_plot.index, anova_table_plot['PR(>F)'],
+                   'ANOVA Results', xlabel='Variable', ylabel='p-value', rotation=45))
+
+
+# ## Logistic Regression
+# MentalHealth is a 0/1 outcome, so a logistic model gives the effects as odds ratios.
+# There are only 54 covariate patterns (2 x 3 x 3 x 3), and the model is fitted on the
+# respondents and cases of each pattern. This gives the same estimates and
+# likelihood-ratio tests as a row-level fit, so it can use every respondent of the
+# cleaned data instead of the undersampled BRFSS_2.
+
+# In[ ]:
+
+
+logistic_fit = logistic_regression(BRFSS_1, 'MentalHealth', anova_factors)
+
+# Odds ratios with 95% confidence intervals
+print(logistic_fit.summary(alpha=0.05))
+
+# Likelihood-ratio test of each factor
+print(logistic_fit.lr_tests())
 
 
 # ## Correlation Matrix
@@ -823,8 +680,9 @@ plt.show()
 # In[53]:
 
 
-# Generate Correlation Matrix
-correlation_matrix = BRFSS_3.corr()
+# Generate Correlation Matrix (once, from the co-occurrence counts X^T X of the one-hot matrix)
+correlation = Correlation.from_data(BRFSS_3_encoded)
+correlation_matrix = correlation.matrix
 
 # Print correlation matrix
 print(correlation_matrix)
@@ -833,35 +691,20 @@ print(correlation_matrix)
 # In[54]:
 
 
-# Find features that are correlated
-correlated_pairs = []
-for i in range(len(correlation_matrix.columns)):
-    for j in range(i+1, len(correlation_matrix.columns)):
-        col1 = correlation_matrix.columns[i]
-        col2 = correlation_matrix.columns[j]
-        corr_value = correlation_matrix.iloc[i, j]
-        correlated_pairs.append((col1, col2, corr_value))
+# Find features that are correlated (upper triangle, strongest first)
+correlated_pairs = correlation.pairs
 
 # Print out correlated pairs with their correlation coefficient
 print("\nCorrelated pairs with their correlation coefficient:")
-for col1, col2, corr_value in correlated_pairs:
+for col1, col2, corr_value in correlated_pairs.itertuples(index=False):
     print(f"{col1} and {col2} have a correlation of {corr_value:.2f}")
 
 
 # In[55]:
 
 
-# Set the figure size
-plt.figure(figsize=(10, 8))
-
-# Create a heatmap
-sns.heatmap(correlation_matrix, annot=True, cmap='RdBu', fmt=".2f")
-
-# Add title
-plt.title('Correlation Matrix')
-
-# Show plot
-plt.show()
+# Annotated heatmap of the correlation matrix
+figures.append(heatmap('Correlation Matrix', correlation_matrix, 'Correlation Matrix'))
 
 
 # ## Correlation Matrix with target variable
@@ -869,14 +712,9 @@ plt.show()
 # In[56]:
 
 
-# Generate correlation matrix
-correlation_matrix = BRFSS_3.corr()
-
-# Get correlation of features with the target variable 'MentalHealth'
-mentalhealth_correlation = correlation_matrix['MentalHealth'].drop('MentalHealth')
-
-# Sort correlations in descending order
-mentalhealth_correlation_sorted = mentalhealth_correlation.abs().sort_values(ascending=False)
+# Get correlation of features with the target variable 'MentalHealth',
+# sorted in descending order (reuses the correlation matrix computed above)
+mentalhealth_correlation_sorted = correlation.with_target('MentalHealth')
 
 # Print correlated features with the target variable 'MentalHealth'
 print("Correlation of features with the target variable 'MentalHealth':")
@@ -887,28 +725,110 @@ for feature, corr_value in mentalhealth_correlation_sorted.items():
 # In[57]:
 
 
-# Generate correlation matrix
-correlation_matrix = BRFSS_3.corr()
+# Filter correlation matrix for the top 10 features correlated with the target variable
+correlation_subset = correlation.top_k('MentalHealth', 10)
 
-# Get correlation of features with the target variable 'MentalHealth'
-mentalhealth_correlation = correlation_matrix['MentalHealth'].drop('MentalHealth')
+# Plot heatmap
+figures.append(heatmap('Correlation Heatmap of Features with MentalHealth', correlation_subset,
+                       "Correlation Heatmap of Features with 'MentalHealth'",
+                       xlabel='Target Variable: MentalHealth', ylabel='Features', linewidths=.5))
 
-# Sort correlations in descending order
-mentalhealth_correlation_sorted = mentalhealth_correlation.abs().sort_values(ascending=False)
 
-# Select top correlated features (optional)
-top_correlated_features = mentalhealth_correlation_sorted.index[:10]  # Select top 10 features
+# ## Stability of the Results
+# The tests above use a single undersampling draw. Repeat the draw 1,000 times
+# (from the joint counts of the cleaned data) and report 95% intervals for each statistic.
 
-# Filter correlation matrix for top correlated features and target variable
-correlation_subset = correlation_matrix.loc[top_correlated_features, ['MentalHealth']]
+# In[ ]:
 
-# Plot heatmap
-plt.figure(figsize=(10, 8))
-sns.heatmap(correlation_subset, annot=True, cmap='RdBu', fmt=".2f", linewidths=.5)
-plt.title("Correlation Heatmap of Features with 'MentalHealth'")
-plt.xlabel("Target Variable: MentalHealth")
-plt.ylabel("Features")
-plt.show()
+
+# Joint counts of the cleaned (not resampled) data
+stability_cube = CountCube.from_frame(BRFSS_1, ['MentalHealth', 'Veteran', 'GeneralHealth', 'Education', 'Age_Group'])
+
+# Chi-square, ANOVA and correlation statistics for 1,000 undersampling draws
+bootstrap_statistics = bootstrap_replicates(stability_cube, response='MentalHealth',
+                                            replicates=1000, seed=1234, max_workers=max_workers)
+
+# Print the mean and 95% interval of each statistic
+print(confidence_intervals(bootstrap_statistics, alpha=0.05))
+
+
+# ## Permutation Tests
+# The chi-square p-values are asymptotic. Compare them with permutation p-values
+# from 100,000 shuffles of the labels of the cleaned data.
+
+# In[ ]:
+
+
+# Permutation and asymptotic p-values of every chi-square test
+permutation_results = permutation_tests(stability_cube, permutations=100_000, seed=1234,
+                                        max_workers=max_workers)
+print(permutation_results)
+
+
+# ## Survey-Weighted Estimates
+# The resampled analysis above treats every respondent alike. BRFSS is a stratified
+# cluster sample, so population-level estimates use the final weight `_LLCPWT`, and
+# the tests account for the design (`_STSTR` strata, `_PSU` clusters) with the
+# Rao-Scott correction of the chi-square statistic.
+
+# In[ ]:
+
+
+# Rao-Scott corrected chi-square tests on the cleaned (not resampled) data
+for column in ['Veteran', 'Age_Group', 'GeneralHealth', 'Education']:
+    result = rao_scott_chi2(BRFSS_1, 'MentalHealth', column)
+    print(f"MentalHealth x {column}: Rao-Scott chi2 = {result.statistic:.2f}, "
+          f"p = {result.pvalue:.3g}, dof = {result.dof}, mean design effect = {result.mean_deff:.2f}")
+
+
+# In[ ]:
+
+
+# Weighted prevalence of frequent mental distress (14+ days) by age group
+print(weighted_group_means(BRFSS_1, 'Age_Group', 'MentalHealth'))
+
+
+# In[ ]:
+
+
+# Weighted correlations of MentalHealth with the one-hot encoded variables
+weighted_encoded = one_hot_encode(BRFSS_1[BRFSS_2_columns], ['Veteran', 'GeneralHealth', 'Education', 'Age_Group'])
+weighted_corr = Correlation.from_data(weighted_encoded, weights=BRFSS_1['_LLCPWT'].to_numpy())
+print(weighted_corr.with_target('MentalHealth'))
+
+
+# ## Age Trend
+# The three `Age_Group` buckets hide the shape of the age trend. Count the respondents
+# and the cases of frequent mental distress (14+ days) for every year of age from 18 to
+# 80 (`_AGE80` is top-coded at 80), with 95% Wilson intervals and a LOWESS curve fitted
+# to the 63 per-age prevalences.
+
+# In[ ]:
+
+
+age_trend_table = age_trend(BRFSS_1, age='_AGE80', outcome='MentalHealth', interval='wilson', smoother='lowess')
+print(age_trend_table)
+
+# Survey-weighted trend, with exact (Clopper-Pearson) intervals on the effective sample sizes
+weighted_age_trend = age_trend(BRFSS_1, weights='_LLCPWT', interval='clopper-pearson')
+print(weighted_age_trend[['age', 'prevalence', 'lower', 'upper', 'smoothed']])
+
+figures.append(trend('Frequent Mental Distress by Age', age_trend_table,
+                     'Frequent Mental Distress (14+ days) by Age'))
+
+
+# ## Figures
+# Render every collected figure on the Agg backend in a process pool and write the
+# PNGs, with a `manifest.json` describing them, to `Results/Images`.
+
+# In[ ]:
+
+
+figure_manifest = render_figures(figures, directory=IMAGES_DIR, max_workers=max_workers)
+
+# Print the files written
+for entry in figure_manifest:
+    print(entry['file'])
 
 
 # # Final Evaluation